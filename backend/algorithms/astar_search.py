@@ -3,130 +3,400 @@ A* Search Algorithm for finding optimal investigation path
 """
 
 import heapq
+import random
+from collections import deque
+from math import inf
 from typing import List, Dict, Tuple
+from algorithms.csp_solver import CSPSolver
+from algorithms.domains import count_values, is_singleton
 
 class InvestigationNode:
-    def __init__(self, state, action=None, parent=None, cost=0):
-        self.state = state  # Current game state (which evidence discovered)
+    def __init__(self, state, action=None, parent=None, cost=0, remaining=0):
+        self.state = state  # Tuple of domain bitmasks, one per variable
+        self.remaining = remaining  # Bitmask of evidence not yet used on this path
         self.action = action  # Action that led to this state
         self.parent = parent
         self.g_cost = cost  # Actual cost from start
         self.h_cost = 0  # Heuristic cost to goal
         self.f_cost = 0  # Total cost (g + h)
         
+    @property
+    def key(self):
+        """Immutable, hashable identity of the search state"""
+        return (self.state, self.remaining)
+        
     def __lt__(self, other):
-        return self.f_cost < other.f_cost
+        # Ties go to the deeper node, which reaches the goal sooner
+        if self.f_cost != other.f_cost:
+            return self.f_cost < other.f_cost
+        return self.g_cost > other.g_cost
+
+class NodeRecorder:
+    """
+    Bounded recording of expanded nodes for visualization
+    'ring' keeps the latest `limit` expansions, 'sample' keeps a uniform
+    reservoir sample of all of them. Entries stay raw until serialized.
+    """
+    
+    STRATEGIES = ('ring', 'sample')
+    
+    def __init__(self, limit, strategy='ring', seed=0):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown recording strategy: {strategy}")
+        self.limit = limit
+        self.strategy = strategy
+        self.total = 0  # Expansions seen, recorded or not
+        self._rng = random.Random(seed)
+        self._entries = deque(maxlen=limit) if strategy == 'ring' else []
+    
+    def add(self, node):
+        order = self.total
+        self.total += 1
+        entry = (order, node.state, node.action, node.g_cost, node.h_cost, node.f_cost)
+        
+        if self.strategy == 'ring':
+            self._entries.append(entry)
+        elif len(self._entries) < self.limit:
+            self._entries.append(entry)
+        else:
+            slot = self._rng.randrange(self.total)
+            if slot < self.limit:
+                self._entries[slot] = entry
+    
+    def entries(self):
+        """Recorded entries in expansion order"""
+        return sorted(self._entries, key=lambda entry: entry[0])
 
 class AStarSearch:
-    def __init__(self, case_data, current_state):
+    def __init__(self, case_data, current_state, recorder=None):
+        """
+        recorder: optional NodeRecorder; expanded nodes are only kept for
+                  visualization when one is given
+        """
         self.case_data = case_data
         self.current_state = current_state
-        self.explored_nodes = []
+        self.index = current_state.index
+        self.recorder = recorder
+        # Shared propagation code, used only to simulate evidence
+        self.solver = CSPSolver(self.index.full(), [], index=self.index, record_steps=False)
+        self._constraints = {}
+        # Variables share no value: evidence can only narrow what it names
+        values = [value for var in self.index.variables for value in self.index.values[var]]
+        self._separable = len(values) == len(set(values))
         
-    def heuristic(self, domains):
+    def to_state(self, masks):
+        """Domain masks dict -> hashable state tuple (case variable order)"""
+        return tuple(masks[var] for var in self.index.variables)
+    
+    def to_domains(self, state):
+        """State tuple -> list view of the domains"""
+        return self.index.decode(dict(zip(self.index.variables, state)))
+        
+    def heuristic(self, state, remaining):
         """
-        Heuristic function: estimate remaining actions needed
-        h(n) = number of variables not yet narrowed to single value
+        Admissible lower bound on the cost still to pay
+        remaining: bitmask of the evidence still available
+        Each unresolved variable needs either a confirmation or enough
+        eliminations to leave one value, and evidence only narrows the
+        variables it names (all-different arcs prune nothing while no value
+        is shared between variables), so the per-variable bounds add up.
+        Evidence naming several values counts an equal share of its cost
+        for each. Otherwise the bound is the cheapest remaining action.
+        Returns inf when the goal can no longer be reached.
         """
+        if self.is_goal(state):
+            return 0
+        if not self._separable:
+            return next((cost for cost, bit in self._by_cost if remaining & bit), 0)
+        
         h = 0
-        for var_type, values in domains.items():
-            if len(values) > 1:
-                h += len(values) - 1
+        for mask, effects in zip(state, self._effects):
+            size = count_values(mask)
+            if size <= 1:
+                continue
+            confirm = inf
+            eliminate = {}
+            for bit, share, value_bit, action_type in effects:
+                if not remaining & bit or not mask & value_bit:
+                    continue
+                if action_type == 'confirm':
+                    confirm = min(confirm, share)
+                elif share < eliminate.get(value_bit, inf):
+                    eliminate[value_bit] = share
+            costs = sorted(eliminate.values())
+            bound = min(confirm, sum(costs[:size - 1]) if len(costs) >= size - 1 else inf)
+            if bound == inf:
+                return inf
+            h += bound
         return h
     
-    def is_goal(self, domains):
+    def is_goal(self, state):
         """Check if we've narrowed down to single solution"""
-        return all(len(values) == 1 for values in domains.values())
+        return all(is_singleton(mask) for mask in state)
+    
+    def evidence_constraints(self, evidence):
+        """
+        Evidence's effect as (variable, value, action_type) tuples
+        Accepts case data constraints ({'eliminates': ..., 'confirms': ...})
+        as well as game evidence carrying a single compiled tuple
+        """
+        evidence_id = evidence['id']
+        if evidence_id in self._constraints:
+            return self._constraints[evidence_id]
+        
+        constraint = evidence.get('constraint')
+        constraints = []
+        if isinstance(constraint, tuple):
+            constraints.append(constraint)
+        elif constraint:
+            for var_type, values in constraint.get('eliminates', {}).items():
+                for value in values:
+                    constraints.append((var_type, value, 'eliminate'))
+            for var_type, value in constraint.get('confirms', {}).items():
+                constraints.append((var_type, value, 'confirm'))
+        
+        self._constraints[evidence_id] = constraints
+        return constraints
+    
+    def apply_evidence(self, state, evidence):
+        """
+        Return new state tuple after evidence's eliminations and
+        confirmations plus constraint propagation (None if inconsistent)
+        """
+        masks = self.solver.simulate(
+            dict(zip(self.index.variables, state)),
+            self.evidence_constraints(evidence)
+        )
+        if masks is None:
+            return None
+        return self.to_state(masks)
     
     def get_successors(self, node):
-        """Get all possible next actions from current state"""
+        """Get next actions from the node's own remaining evidence"""
         successors = []
-        available_actions = self.case_data.get_available_actions()
+        remaining = node.remaining
         
-        for evidence in available_actions:
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            evidence = self.evidence_by_bit[bit]
+            
             # Simulate applying this action
-            new_domains = {k: v.copy() for k, v in node.state.items()}
+            new_state = self.apply_evidence(node.state, evidence)
             
-            # Apply constraint
-            if 'eliminates' in evidence['constraint']:
-                for var_type, values in evidence['constraint']['eliminates'].items():
-                    if var_type in new_domains:
-                        new_domains[var_type] = [v for v in new_domains[var_type] 
-                                                  if v not in values]
+            # Evidence that changes nothing only adds cost
+            if new_state is None or new_state == node.state:
+                continue
             
             new_node = InvestigationNode(
-                state=new_domains,
+                state=new_state,
                 action=evidence,
                 parent=node,
-                cost=node.g_cost + evidence['cost']
+                cost=node.g_cost + evidence['cost'],
+                remaining=node.remaining & ~bit
             )
             successors.append(new_node)
         
         return successors
     
-    def search(self):
+    def search(self, mode='astar', node_limit=None, memory_limit=None):
         """
-        Execute A* search to find optimal investigation path
+        Find the optimal investigation path
+        mode: 'astar' (full frontier) or 'ida' (iterative deepening A*,
+              memory linear in path length)
+        node_limit: stop after this many node expansions
+        memory_limit: max states IDA* remembers per iteration to skip
+                      duplicate paths (None = unbounded)
         Returns: best action to take next with explanation
         """
-        # Start node
+        if mode == 'astar':
+            return self.astar_search(node_limit)
+        if mode == 'ida':
+            return self.ida_search(node_limit, memory_limit)
+        raise ValueError(f"Unknown search mode: {mode}")
+    
+    def _index_evidence(self, available_actions):
+        """Bit per undiscovered evidence item, for the remaining-evidence sets"""
+        self.evidence_by_bit = {
+            1 << i: evidence
+            for i, evidence in enumerate(available_actions)
+        }
+        # Cheapest first, for the heuristic
+        self._by_cost = sorted((evidence['cost'], bit) for bit, evidence in self.evidence_by_bit.items())
+        
+        # Per variable: (evidence bit, cost share, value bit, action type)
+        positions = {var: i for i, var in enumerate(self.index.variables)}
+        self._effects = [[] for _ in self.index.variables]
+        for bit, evidence in self.evidence_by_bit.items():
+            constraints = self.evidence_constraints(evidence)
+            for variable, value, action_type in constraints:
+                self._effects[positions[variable]].append(
+                    (bit, evidence['cost'] / len(constraints), self.index.bit(variable, value), action_type)
+                )
+        return (1 << len(self.evidence_by_bit)) - 1
+    
+    def _start_node(self):
+        """Root node for the current state; indexes the undiscovered evidence"""
         start_node = InvestigationNode(
-            state=self.current_state.current_domains.copy(),
-            cost=self.current_state.total_cost
+            state=self.to_state(self.current_state.domain_masks),
+            cost=self.current_state.total_cost,
+            remaining=self._index_evidence(self.case_data.get_available_actions())
         )
-        start_node.h_cost = self.heuristic(start_node.state)
+        start_node.h_cost = self.heuristic(start_node.state, start_node.remaining)
         start_node.f_cost = start_node.g_cost + start_node.h_cost
+        return start_node
+    
+    @property
+    def explored_nodes(self):
+        """Recorded expansions as JSON-ready dicts"""
+        if self.recorder is None:
+            return []
+        return [
+            {
+                'order': order,
+                'state': self.to_domains(state),
+                'action': action['action'] if action else 'Start',
+                'g_cost': g_cost,
+                'h_cost': h_cost,
+                'f_cost': f_cost
+            }
+            for order, state, action, g_cost, h_cost, f_cost in self.recorder.entries()
+        ]
+    
+    def _found(self, goal, nodes_explored, mode):
+        """Result for a goal node"""
+        path = self.reconstruct_path(goal)
+        return {
+            'success': True,
+            'mode': mode,
+            'next_action': path[0] if path else None,
+            'optimal_path': path,
+            'total_cost': goal.g_cost,
+            'nodes_explored': nodes_explored,
+            'path_length': len(path),
+            'explored_nodes': self.explored_nodes
+        }
+    
+    def _not_found(self, nodes_explored, mode, limit_reached=False):
+        """Result when the search fails or hits its node limit"""
+        return {
+            'success': False,
+            'mode': mode,
+            'message': 'Node limit reached' if limit_reached else 'No solution found',
+            'nodes_explored': nodes_explored
+        }
+    
+    def astar_search(self, node_limit=None):
+        """
+        Execute A* search to find optimal investigation path
+        Returns: best action to take next with explanation
+        """
+        start_node = self._start_node()
         
         # Priority queue (min-heap)
         frontier = []
         heapq.heappush(frontier, start_node)
         
-        explored = set()
+        # Best known g per state; heap entries with a worse g are stale
+        best_g = {start_node.key: start_node.g_cost}
+        closed = set()
         nodes_explored = 0
         
         while frontier:
             current = heapq.heappop(frontier)
+            key = current.key
+            
+            # Lazy deletion of stale or already expanded entries
+            if key in closed or current.g_cost > best_g[key]:
+                continue
+            closed.add(key)
             nodes_explored += 1
             
             # Store for visualization
-            self.explored_nodes.append({
-                'state': current.state,
-                'action': current.action['action'] if current.action else 'Start',
-                'g_cost': current.g_cost,
-                'h_cost': current.h_cost,
-                'f_cost': current.f_cost
-            })
+            if self.recorder is not None:
+                self.recorder.add(current)
             
             # Goal check
             if self.is_goal(current.state):
-                path = self.reconstruct_path(current)
-                return {
-                    'success': True,
-                    'next_action': path[0] if path else None,
-                    'optimal_path': path,
-                    'total_cost': current.g_cost,
-                    'nodes_explored': nodes_explored,
-                    'path_length': len(path),
-                    'explored_nodes': self.explored_nodes
-                }
+                return self._found(current, nodes_explored, 'astar')
             
-            # Generate state signature for explored set
-            state_sig = str(sorted([(k, tuple(sorted(v))) for k, v in current.state.items()]))
-            if state_sig in explored:
-                continue
-            explored.add(state_sig)
+            if node_limit is not None and nodes_explored >= node_limit:
+                return self._not_found(nodes_explored, 'astar', limit_reached=True)
             
-            # Expand successors
+            # Expand successors, skipping ones dominated by a known path
             for successor in self.get_successors(current):
-                successor.h_cost = self.heuristic(successor.state)
+                successor_key = successor.key
+                if successor_key in closed or successor.g_cost >= best_g.get(successor_key, float('inf')):
+                    continue
+                successor.h_cost = self.heuristic(successor.state, successor.remaining)
+                if successor.h_cost == inf:
+                    continue
+                best_g[successor_key] = successor.g_cost
                 successor.f_cost = successor.g_cost + successor.h_cost
                 heapq.heappush(frontier, successor)
         
-        return {
-            'success': False,
-            'message': 'No solution found',
-            'nodes_explored': nodes_explored
-        }
+        return self._not_found(nodes_explored, 'astar')
+    
+    def ida_search(self, node_limit=None, memory_limit=None):
+        """
+        Iterative deepening A*: depth-first passes bounded by an f-cost
+        threshold that grows to the smallest f that exceeded it
+        Only the current path with its pending siblings (plus an optional
+        capped table of seen states) is kept in memory
+        """
+        start_node = self._start_node()
+        threshold = start_node.f_cost
+        nodes_explored = 0
+        
+        while True:
+            # State -> lowest g seen during this pass (bounded by memory_limit)
+            seen = {}
+            next_threshold = float('inf')
+            stack = [(start_node, None)]
+            
+            while stack:
+                node, successors = stack[-1]
+                
+                if successors is None:
+                    # First visit: goal / threshold checks, then expand
+                    if node.f_cost > threshold:
+                        next_threshold = min(next_threshold, node.f_cost)
+                        stack.pop()
+                        continue
+                    
+                    nodes_explored += 1
+                    if self.recorder is not None:
+                        self.recorder.add(node)
+                    if self.is_goal(node.state):
+                        return self._found(node, nodes_explored, 'ida')
+                    if node_limit is not None and nodes_explored >= node_limit:
+                        return self._not_found(nodes_explored, 'ida', limit_reached=True)
+                    
+                    successors = []
+                    for successor in self.get_successors(node):
+                        key = successor.key
+                        if seen.get(key, float('inf')) <= successor.g_cost:
+                            continue
+                        successor.h_cost = self.heuristic(successor.state, successor.remaining)
+                        if successor.h_cost == inf:
+                            continue
+                        if memory_limit is None or len(seen) < memory_limit or key in seen:
+                            seen[key] = successor.g_cost
+                        successor.f_cost = successor.g_cost + successor.h_cost
+                        successors.append(successor)
+                    
+                    # Visit the most promising successor first
+                    successors.sort(key=lambda n: n.f_cost, reverse=True)
+                    stack[-1] = (node, successors)
+                
+                if successors:
+                    stack.append((successors.pop(), None))
+                else:
+                    stack.pop()
+            
+            if next_threshold == float('inf'):
+                return self._not_found(nodes_explored, 'ida')
+            threshold = next_threshold
     
     def reconstruct_path(self, node):
         """Reconstruct path from goal to start"""
@@ -151,21 +421,20 @@ class AStarSearch:
         best_score = float('inf')
         
         evaluations = []
+        current = self.to_state(self.current_state.domain_masks)
+        remaining = self._index_evidence(available_actions)
         
-        for evidence in available_actions:
-            # Simulate applying this action
-            test_domains = {k: v.copy() for k, v in self.current_state.current_domains.items()}
-            
-            # Apply constraint
-            if 'eliminates' in evidence['constraint']:
-                for var_type, values in evidence['constraint']['eliminates'].items():
-                    if var_type in test_domains:
-                        test_domains[var_type] = [v for v in test_domains[var_type] 
-                                                   if v not in values]
+        for bit, evidence in self.evidence_by_bit.items():
+            # Simulate applying this action; evidence that changes nothing only adds cost
+            test_state = self.apply_evidence(current, evidence)
+            if test_state is None or test_state == current:
+                continue
             
             # Calculate f(n) = g(n) + h(n)
             g = self.current_state.total_cost + evidence['cost']
-            h = self.heuristic(test_domains)
+            h = self.heuristic(test_state, remaining & ~bit)
+            if h == inf:
+                continue
             f = g + h
             
             evaluations.append({
@@ -174,13 +443,16 @@ class AStarSearch:
                 'g_cost': g,
                 'h_cost': h,
                 'f_cost': f,
-                'resulting_domains': test_domains
+                'resulting_domains': self.to_domains(test_state)
             })
             
             if f < best_score:
                 best_score = f
                 best_action = evidence
         
+        if best_action is None:
+            return None
+        
         # Sort by f_cost for display
         evaluations.sort(key=lambda x: x['f_cost'])
         
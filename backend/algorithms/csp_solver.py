@@ -1,94 +1,285 @@
 """
 Enhanced CSP Solver with Arc Consistency (AC-3) and detailed step tracking
 """
-import copy
+from collections import deque
+from algorithms.domains import (
+    DomainIndex, apply_constraint, count_solutions, count_values,
+    is_singleton, is_solved
+)
+
+class BinaryConstraint:
+    """
+    Binary constraint between two variables
+    predicate(value1, value2) returns True when the pair is allowed
+    """
+    def __init__(self, var1, var2, predicate, name='binary'):
+        self.var1 = var1
+        self.var2 = var2
+        self.predicate = predicate
+        self.name = name
+        self._support_index = None
+        self._supports = {}
+
+    def allows(self, xi, value_i, value_j):
+        """Check a pair of values given which side xi is on"""
+        if xi == self.var1:
+            return self.predicate(value_i, value_j)
+        return self.predicate(value_j, value_i)
+
+    def _support_mask(self, index, xi, xj, i):
+        """Bits of xj compatible with the i-th value of xi (cached per case)"""
+        if self._support_index is not index:
+            self._support_index = index
+            self._supports = {}
+        key = (xi, i)
+        if key not in self._supports:
+            value = index.values[xi][i]
+            mask = 0
+            for j, other in enumerate(index.values[xj]):
+                if self.allows(xi, value, other):
+                    mask |= 1 << j
+            self._supports[key] = mask
+        return self._supports[key]
+
+    def revise(self, index, xi, xj, masks):
+        """
+        Remove values of xi without support in xj
+        Returns the new mask of xi
+        """
+        mask_i = masks[xi]
+        mask_j = masks[xj]
+        new_mask = mask_i
+        remaining = mask_i
+        while remaining:
+            low = remaining & -remaining
+            remaining ^= low
+            if not self._support_mask(index, xi, xj, low.bit_length() - 1) & mask_j:
+                new_mask &= ~low
+        return new_mask
+
+    def describe(self, xi, xj, value):
+        """Explanation for removing value from xi"""
+        return f"Removed {value} from {xi} (no support in {xj} under {self.name})"
+
+
+class AllDifferent(BinaryConstraint):
+    """Two variables may not take the same value"""
+    def __init__(self, var1, var2):
+        super().__init__(var1, var2, lambda a, b: a != b, name='all-different')
+
+    def revise(self, index, xi, xj, masks):
+        # A value of xi only loses its support when xj is assigned that value
+        mask_j = masks[xj]
+        if not is_singleton(mask_j):
+            return masks[xi]
+        return masks[xi] & ~index.bit(xi, index.first_value(xj, mask_j))
+
+    def describe(self, xi, xj, value):
+        return f"Removed {value} from {xi} (already assigned to {xj})"
+
+
+def all_different_constraints(variables):
+    """Pairwise all-different constraints over variables"""
+    variables = list(variables)
+    return [
+        AllDifferent(variables[i], variables[j])
+        for i in range(len(variables))
+        for j in range(i + 1, len(variables))
+    ]
+
 
 class CSPSolver:
-    def __init__(self, domains, constraints):
+    def __init__(self, domains, constraints, index=None, binary_constraints=None, record_steps=True):
         """
         Initialize CSP Solver
-        domains: dict of {variable: [possible_values]}
+        domains: dict of {variable: bitmask} when index is given,
+                 otherwise dict of {variable: [possible_values]}
         constraints: list of (category, value, action_type) tuples
+        index: DomainIndex shared with the game state
+        binary_constraints: list of BinaryConstraint (defaults to all-different)
+        record_steps: keep visualization steps (planners turn this off)
         """
-        self.domains = copy.deepcopy(domains)
-        self.constraints = constraints
+        if index is None:
+            index = DomainIndex(domains)
+            domains = index.encode(domains)
+        self.index = index
+        self.masks = dict(domains)
+        self.constraints = list(constraints)
+        if binary_constraints is None:
+            binary_constraints = all_different_constraints(self.masks)
+        self.binary_constraints = binary_constraints
+        self.record_steps = record_steps
         self.steps = []
-    
+
+        # Arcs (xi, xj, constraint), grouped by the variable xj they draw support from
+        self.arcs = []
+        self.dependent_arcs = {var: [] for var in self.masks}
+        for constraint in binary_constraints:
+            for xi, xj in ((constraint.var1, constraint.var2), (constraint.var2, constraint.var1)):
+                arc = (xi, xj, constraint)
+                self.arcs.append(arc)
+                self.dependent_arcs[xj].append(arc)
+
+        self.stats = {
+            'arcs_enqueued': 0,
+            'arcs_processed': 0,
+            'arcs_revised': 0,
+            'values_removed': 0
+        }
+
+    @property
+    def domains(self):
+        """List view of the current domains"""
+        return self.index.decode(self.masks)
+
     def solve(self):
         """
         Solve CSP using constraint propagation
         Returns True if consistent, False if inconsistency detected
         """
         self.steps = []
-        
+        self.stats = dict.fromkeys(self.stats, 0)
+
         # Apply explicit constraints first
-        for category, value, action_type in self.constraints:
-            if action_type == 'eliminate':
-                if value in self.domains[category]:
-                    self.domains[category].remove(value)
-                    self.steps.append({
-                        'step': 'Elimination',
-                        'message': f"Eliminated {value} from {category}",
-                        'type': 'elimination'
-                    })
-            elif action_type == 'confirm':
-                if len(self.domains[category]) > 1:
-                    self.domains[category] = [value]
-                    self.steps.append({
-                        'step': 'Confirmation',
-                        'message': f"Confirmed {value} as {category}",
-                        'type': 'confirmation'
-                    })
-        
+        self._apply_constraints(self.constraints, describe=True)
+
         # Apply arc consistency
-        changed = True
-        iterations = 0
-        max_iterations = 10
-        
-        while changed and iterations < max_iterations:
-            changed = False
-            iterations += 1
-            
-            # Check for singleton domains and propagate
-            for var1, values1 in self.domains.items():
-                if len(values1) == 1:
-                    # This variable is assigned, check others
-                    assigned_value = values1[0]
-                    
-                    for var2, values2 in self.domains.items():
-                        if var1 != var2 and assigned_value in values2 and len(values2) > 1:
-                            # Remove this value from other domain
-                            self.domains[var2].remove(assigned_value)
-                            changed = True
-                            self.steps.append({
-                                'step': 'Arc Consistency',
-                                'message': f"Removed {assigned_value} from {var2} (already assigned to {var1})",
-                                'type': 'elimination'
-                            })
-        
-        # Check for empty domains
-        for var, values in self.domains.items():
-            if len(values) == 0:
+        self.ac3(self.arcs)
+
+        return self._check_consistency()
+
+    def propagate(self, constraints, describe=True):
+        """
+        Incrementally add constraints and propagate from the current fixpoint
+        Only arcs that depend on a domain changed by the new constraints
+        are revised, so the cost does not grow with the constraint history
+        describe: record steps for the new constraints themselves
+        Returns True if consistent, False if inconsistency detected
+        """
+        self.steps = []
+        self.stats = dict.fromkeys(self.stats, 0)
+
+        changed = self._apply_constraints(constraints, describe)
+        self.ac3([arc for var in changed for arc in self.dependent_arcs[var]])
+
+        return self._check_consistency()
+
+    def simulate(self, masks, constraints):
+        """
+        Propagate constraints from masks without changing the solver's state
+        Used by planners to evaluate evidence
+        Returns the resulting masks, or None if they are inconsistent
+        """
+        saved = self.masks
+        self.masks = dict(masks)
+        try:
+            if not self.propagate(constraints, describe=False):
+                return None
+            return self.masks
+        finally:
+            self.masks = saved
+
+    def _apply_constraints(self, constraints, describe):
+        """Apply unary constraints; returns the variables whose domain changed"""
+        changed = []
+        for category, value, action_type in constraints:
+            if not apply_constraint(self.masks, self.index, category, value, action_type):
+                continue
+            if category not in changed:
+                changed.append(category)
+            if not (describe and self.record_steps):
+                continue
+            if action_type == 'eliminate':
+                self.steps.append({
+                    'step': 'Elimination',
+                    'message': f"Eliminated {value} from {category}",
+                    'type': 'elimination'
+                })
+            else:
+                self.steps.append({
+                    'step': 'Confirmation',
+                    'message': f"Confirmed {value} as {category}",
+                    'type': 'confirmation'
+                })
+        return changed
+
+    def ac3(self, arcs):
+        """
+        Worklist AC-3: revise queued arcs, re-enqueueing only the arcs
+        that draw support from a variable whose domain just shrank
+        Returns False when a domain is wiped out
+        """
+        queue = deque(arcs)
+        queued = set(arcs)
+        self.stats['arcs_enqueued'] += len(queue)
+
+        while queue:
+            arc = queue.popleft()
+            queued.discard(arc)
+            xi, xj, constraint = arc
+            self.stats['arcs_processed'] += 1
+
+            if not self.revise(xi, xj, constraint):
+                continue
+
+            if self.masks[xi] == 0:
+                return False
+
+            for neighbor_arc in self.dependent_arcs[xi]:
+                if neighbor_arc[0] != xj and neighbor_arc not in queued:
+                    queue.append(neighbor_arc)
+                    queued.add(neighbor_arc)
+                    self.stats['arcs_enqueued'] += 1
+
+        return True
+
+    def revise(self, xi, xj, constraint):
+        """Revise arc xi -> xj; returns True if xi's domain shrank"""
+        old_mask = self.masks[xi]
+        new_mask = constraint.revise(self.index, xi, xj, self.masks)
+        if new_mask == old_mask:
+            return False
+
+        self.masks[xi] = new_mask
+        self.stats['arcs_revised'] += 1
+        if not self.record_steps:
+            self.stats['values_removed'] += count_values(old_mask & ~new_mask)
+            return True
+        for value in self.index.values_of(xi, old_mask & ~new_mask):
+            self.stats['values_removed'] += 1
+            self.steps.append({
+                'step': 'Arc Consistency',
+                'message': constraint.describe(xi, xj, value),
+                'type': 'elimination'
+            })
+        return True
+
+    def _check_consistency(self):
+        """Check for empty domains"""
+        for var, mask in self.masks.items():
+            if mask == 0:
+                if not self.record_steps:
+                    return False
                 self.steps.append({
                     'step': 'Inconsistency',
                     'message': f"Domain of {var} is empty - no solution possible",
                     'type': 'error'
                 })
                 return False
-        
         return True
-    
+
     def get_steps(self):
         """Return all algorithm steps for visualization"""
         return self.steps
-    
+
+    def get_stats(self):
+        """Return propagation counters of the last solve/propagate call"""
+        return dict(self.stats)
+
     def is_solved(self):
         """Check if all variables are assigned"""
-        return all(len(values) == 1 for values in self.domains.values())
-    
+        return is_solved(self.masks)
+
     def count_solutions(self):
         """Count number of possible solutions"""
-        count = 1
-        for values in self.domains.values():
-            count *= len(values)
-        return count
\ No newline at end of file
+        return count_solutions(self.masks)
@@ -0,0 +1,97 @@
+"""
+Bitmask domain representation shared by the CSP solver, game state and planners
+"""
+
+class DomainIndex:
+    """
+    Value <-> bit mapping for one case
+    Every domain is a single int per variable: bit i is set while the
+    i-th value of that variable is still possible
+    """
+    def __init__(self, domains):
+        """
+        domains: dict of {variable: [all_values]} describing the full case
+        """
+        self.variables = tuple(domains)
+        self.values = {var: tuple(values) for var, values in domains.items()}
+        self.bits = {
+            var: {value: 1 << i for i, value in enumerate(values)}
+            for var, values in self.values.items()
+        }
+        self.full_masks = {
+            var: (1 << len(values)) - 1 for var, values in self.values.items()
+        }
+
+    def bit(self, variable, value):
+        """Bit of value in variable's domain (0 if the value is unknown)"""
+        return self.bits[variable].get(value, 0)
+
+    def mask_of(self, variable, values):
+        """Combined bits of several values of one variable"""
+        bits = self.bits[variable]
+        mask = 0
+        for value in values:
+            mask |= bits.get(value, 0)
+        return mask
+
+    def full(self):
+        """Fresh masks with every value still possible"""
+        return dict(self.full_masks)
+
+    def encode(self, domains):
+        """Convert {variable: [values]} to {variable: bitmask}"""
+        return {var: self.mask_of(var, values) for var, values in domains.items()}
+
+    def decode(self, masks):
+        """Convert {variable: bitmask} to {variable: [values]} for JSON responses"""
+        return {var: self.values_of(var, mask) for var, mask in masks.items()}
+
+    def values_of(self, variable, mask):
+        """List view of one domain, in case order"""
+        values = self.values[variable]
+        return [values[i] for i in range(len(values)) if mask >> i & 1]
+
+    def first_value(self, variable, mask):
+        """Lowest value still present in mask (the value of a singleton)"""
+        if not mask:
+            return None
+        return self.values[variable][(mask & -mask).bit_length() - 1]
+
+
+def count_values(mask):
+    """Number of values left in a domain"""
+    return bin(mask).count('1')
+
+def is_singleton(mask):
+    """True when exactly one value is left"""
+    return mask != 0 and mask & (mask - 1) == 0
+
+def is_solved(masks):
+    """True when every variable is narrowed to a single value"""
+    return all(is_singleton(mask) for mask in masks.values())
+
+def count_solutions(masks):
+    """Number of value combinations left (product of domain sizes)"""
+    count = 1
+    for mask in masks.values():
+        count *= count_values(mask)
+    return count
+
+def apply_constraint(masks, index, variable, value, action_type):
+    """
+    Apply one (variable, value, action_type) constraint in place
+    Returns True if the domain changed
+    """
+    mask = masks[variable]
+    bit = index.bit(variable, value)
+    if action_type == 'eliminate':
+        new_mask = mask & ~bit
+    elif action_type == 'confirm':
+        new_mask = mask & bit if count_values(mask) > 1 else mask
+    else:
+        return False
+
+    if new_mask == mask:
+        return False
+    masks[variable] = new_mask
+    return True
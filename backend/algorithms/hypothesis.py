@@ -0,0 +1,186 @@
+"""
+Hypothesis tensor: one boolean cell per full solution (suspect x weapon x location)
+Evidence is applied as vectorized masks; counts, marginals and projections
+back to per-variable domains are exact even under joint constraints
+(apply_relation), where the product of domain sizes over-counts. Clues on
+a single variable keep bitmask counting exact, so the tensor is opt-in
+(HYPOTHESIS_TENSOR=1) and needs NumPy; callers fall back to bitmask
+counting when it is off, missing or the case is too large.
+"""
+import os
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+# Keep a tensor per session (only pays off once clues relate variables)
+HYPOTHESIS_TENSOR = os.environ.get('HYPOTHESIS_TENSOR', '0') == '1'
+# Largest tensor kept per session (one byte per hypothesis)
+MAX_HYPOTHESES = 1_000_000
+
+
+class HypothesisSpace:
+    """Boolean array over every combination of values, one axis per variable"""
+
+    def __init__(self, index, tensor=None):
+        self.index = index
+        self.variables = index.variables
+        self.axes = {var: axis for axis, var in enumerate(self.variables)}
+        if tensor is None:
+            shape = tuple(len(index.values[var]) for var in self.variables)
+            tensor = np.ones(shape, dtype=bool)
+        self.tensor = tensor
+
+    @classmethod
+    def for_index(cls, index, max_hypotheses=MAX_HYPOTHESES):
+        """Full hypothesis space over a domain index, or None if disabled, unavailable or too large"""
+        if not HYPOTHESIS_TENSOR or np is None:
+            return None
+        total = 1
+        for var in index.variables:
+            total *= len(index.values[var])
+        if total > max_hypotheses:
+            return None
+        return cls(index)
+
+    @classmethod
+    def for_case(cls, case, max_hypotheses=MAX_HYPOTHESES):
+        return cls.for_index(case['index'], max_hypotheses)
+
+    def _axis_vector(self, variable, mask):
+        """Boolean vector of mask's bits, shaped to broadcast along variable's axis"""
+        size = len(self.index.values[variable])
+        bits = np.array([mask >> i & 1 for i in range(size)], dtype=bool)
+        shape = [1] * len(self.variables)
+        shape[self.axes[variable]] = size
+        return bits.reshape(shape)
+
+    def apply_masks(self, masks):
+        """
+        Keep only hypotheses allowed by per-variable domain masks
+        Pass just the variables that narrowed: each one is a pass over the tensor
+        """
+        for variable, mask in masks.items():
+            if mask != self.index.full_masks[variable]:
+                self.tensor &= self._axis_vector(variable, mask)
+
+    def apply_constraint(self, variable, value, action_type):
+        """Apply one (variable, value, action_type) evidence constraint"""
+        bit = self.index.bit(variable, value)
+        if not bit:
+            return
+        i = bit.bit_length() - 1
+        selector = [slice(None)] * len(self.variables)
+        if action_type == 'eliminate':
+            selector[self.axes[variable]] = i
+            self.tensor[tuple(selector)] = False
+        elif action_type == 'confirm':
+            keep = self.tensor.take(i, axis=self.axes[variable])
+            self.tensor[...] = False
+            selector[self.axes[variable]] = i
+            self.tensor[tuple(selector)] = keep
+
+    def apply_relation(self, var1, var2, predicate):
+        """
+        Joint constraint between two variables
+        predicate(value1, value2) returns True when the pair is allowed
+        """
+        values1 = self.index.values[var1]
+        values2 = self.index.values[var2]
+        allowed = np.array([[predicate(a, b) for b in values2] for a in values1], dtype=bool)
+        axis1, axis2 = self.axes[var1], self.axes[var2]
+        if axis1 > axis2:
+            allowed = allowed.T
+            axis1, axis2 = axis2, axis1
+        shape = [1] * len(self.variables)
+        shape[axis1] = allowed.shape[0]
+        shape[axis2] = allowed.shape[1]
+        self.tensor &= allowed.reshape(shape)
+
+    def count(self):
+        """Number of hypotheses still possible"""
+        return int(np.count_nonzero(self.tensor))
+
+    def marginals(self):
+        """Per variable, how many hypotheses remain for each value: {var: array}"""
+        result = {}
+        for variable, axis in self.axes.items():
+            others = tuple(a for a in range(len(self.variables)) if a != axis)
+            result[variable] = self.tensor.sum(axis=others)
+        return result
+
+    def project(self):
+        """Per-variable domain masks of the values that still appear in some hypothesis"""
+        masks = {}
+        for variable, axis in self.axes.items():
+            others = tuple(a for a in range(len(self.variables)) if a != axis)
+            mask = 0
+            for i in np.flatnonzero(self.tensor.any(axis=others)):
+                mask |= 1 << int(i)
+            masks[variable] = mask
+        return masks
+
+
+def _target_offsets(index, actions):
+    """Position of each action's target in the concatenated marginals (-1 if none)"""
+    starts = {}
+    offset = 0
+    for var in index.variables:
+        starts[var] = offset
+        offset += len(index.values[var])
+    offsets = []
+    for action in actions:
+        target = action.get('target')
+        bit = index.bit(*target) if target else 0
+        offsets.append(starts[target[0]] + bit.bit_length() - 1 if bit else -1)
+    return offsets
+
+def _mask_marginals(index, masks):
+    """Marginals implied by independent per-variable domains: (total, {var: [counts]})"""
+    total = 1
+    sizes = {}
+    for var, mask in masks.items():
+        sizes[var] = bin(mask).count('1')
+        total *= sizes[var]
+    marginals = {
+        var: [total // sizes[var] if masks[var] >> i & 1 else 0 for i in range(len(index.values[var]))]
+        for var in index.variables
+    }
+    return total, marginals
+
+def information_gains(index, masks, actions, hypotheses=None):
+    """
+    Expected entropy reduction (bits) of every action, uniform over the
+    remaining hypotheses. Each targeted action has two outcomes (its target
+    is confirmed or eliminated); the action x outcome matrix of hypothesis
+    counts gives all gains in a handful of array ops.
+    hypotheses: synced HypothesisSpace for exact joint counts (optional)
+    Returns a list of gains in action order
+    """
+    if hypotheses is not None:
+        total = hypotheses.count()
+        marginals = hypotheses.marginals()
+    else:
+        total, marginals = _mask_marginals(index, masks)
+    if total <= 1:
+        return [0.0] * len(actions)
+    offsets = _target_offsets(index, actions)
+
+    if np is None:
+        import math
+        flat = [count for var in index.variables for count in marginals[var]]
+        gains = []
+        for offset in offsets:
+            confirmed = flat[offset] if offset >= 0 else total
+            expected = sum(n / total * math.log2(n) for n in (confirmed, total - confirmed) if n)
+            gains.append(math.log2(total) - expected)
+        return gains
+
+    # Untargeted actions point at a trailing "all hypotheses" cell: no information
+    flat = np.concatenate([np.asarray(marginals[var], dtype=float) for var in index.variables] + [[total]])
+    confirmed = flat[np.asarray(offsets, dtype=int)]
+    counts = np.stack([confirmed, total - confirmed], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = np.where(counts > 0, counts / total * np.log2(counts), 0.0).sum(axis=1)
+    return (np.log2(total) - expected).tolist()
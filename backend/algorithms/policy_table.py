@@ -0,0 +1,259 @@
+"""
+Offline-precomputed optimal investigation policy
+
+The investigation is solved as an MDP by dynamic programming over domain
+states: every remaining solution is equally likely, so evidence targeting
+(variable, value) confirms it with probability 1/|domain| and eliminates
+it otherwise. The table maps each state to the action with the lowest
+expected remaining cost and stores that cost.
+
+Build a table (from backend/):
+    python -m algorithms.policy_table
+    python -m algorithms.policy_table --suspects 4 --weapons 4 --locations 4 --seed 1
+"""
+import argparse
+import array
+import json
+import os
+import threading
+from collections import OrderedDict
+from algorithms.domains import count_values, is_singleton
+
+# Cases whose joint state space is larger than this are left to live search
+MAX_POLICY_STATES = 1 << 20
+# Without a precomputed table, only cases this small are solved in a request
+# (4x4x4 takes tens of milliseconds)
+MAX_LIVE_POLICY_STATES = 1 << 12
+# Policies kept in memory at once, least recently used evicted first
+MAX_CACHED_POLICIES = 32
+
+POLICY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'policies')
+FILE_MAGIC = b'DPOL1\n'
+
+
+class PolicyTable:
+    """Optimal action and expected remaining cost for every domain state"""
+
+    def __init__(self, case_key, variables, sizes, entries):
+        """
+        entries: {packed_state: (expected_cost, evidence_id)}
+        """
+        self.case_key = case_key
+        self.variables = tuple(variables)
+        self.sizes = tuple(sizes)
+        self.entries = entries
+        # Bit offset of each variable inside a packed state
+        self.offsets = []
+        offset = 0
+        for size in self.sizes:
+            self.offsets.append(offset)
+            offset += size
+
+    def pack(self, state):
+        """State tuple -> single int key"""
+        key = 0
+        for mask, offset in zip(state, self.offsets):
+            key |= mask << offset
+        return key
+
+    def state_of(self, masks):
+        return tuple(masks[var] for var in self.variables)
+
+    def lookup(self, masks):
+        """(evidence_id, expected_cost) for the state, or None if unknown"""
+        entry = self.entries.get(self.pack(self.state_of(masks)))
+        if entry is None or entry[0] == float('inf'):
+            return None
+        return entry[1], entry[0]
+
+    def expected_cost(self, state):
+        entry = self.entries.get(self.pack(state))
+        return float('inf') if entry is None else entry[0]
+
+    def action_values(self, index, masks, available_actions):
+        """
+        Expected total remaining cost of each available action (Q-values)
+        Returns {evidence_id: expected_cost}
+        """
+        state = self.state_of(masks)
+        positions = {var: i for i, var in enumerate(self.variables)}
+        stay = self.expected_cost(state)
+        values = {}
+        for action in available_actions:
+            target = action.get('target')
+            expected = stay
+            if target:
+                pos = positions[target[0]]
+                mask = state[pos]
+                bit = index.bit(target[0], target[1])
+                size = count_values(mask)
+                if mask & bit and size > 1:
+                    confirm = state[:pos] + (bit,) + state[pos + 1:]
+                    eliminate = state[:pos] + (mask & ~bit,) + state[pos + 1:]
+                    expected = (self.expected_cost(confirm) + (size - 1) * self.expected_cost(eliminate)) / size
+            values[action['id']] = action['cost'] + expected
+        return values
+
+    def save(self, path):
+        """Write the table as a header line plus packed binary columns"""
+        keys = sorted(self.entries)
+        header = {
+            'case_key': self.case_key,
+            'variables': list(self.variables),
+            'sizes': list(self.sizes),
+            'count': len(keys)
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(FILE_MAGIC)
+            f.write(json.dumps(header).encode() + b'\n')
+            array.array('Q', keys).tofile(f)
+            array.array('d', (self.entries[k][0] for k in keys)).tofile(f)
+            array.array('I', (self.entries[k][1] for k in keys)).tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.readline() != FILE_MAGIC:
+                raise ValueError(f"Not a policy table: {path}")
+            header = json.loads(f.readline())
+            count = header['count']
+            keys = array.array('Q')
+            costs = array.array('d')
+            actions = array.array('I')
+            keys.fromfile(f, count)
+            costs.fromfile(f, count)
+            actions.fromfile(f, count)
+        entries = dict(zip(keys, zip(costs, actions)))
+        return cls(header['case_key'], header['variables'], header['sizes'], entries)
+
+
+def _cheapest_evidence(case):
+    """Cheapest evidence per target: [{bit: (cost, evidence_id)}] per variable"""
+    index = case['index']
+    targets = [{} for _ in index.variables]
+    positions = {var: i for i, var in enumerate(index.variables)}
+    for evidence in case['evidence']:
+        target = case['rules'][evidence['id']]['target']
+        if target is None:
+            continue
+        pos = positions[target[0]]
+        bit = index.bit(*target)
+        option = (evidence['cost'], evidence['id'])
+        if bit not in targets[pos] or option < targets[pos][bit]:
+            targets[pos][bit] = option
+    return targets
+
+def solve_policy(case, max_states=MAX_POLICY_STATES):
+    """
+    Solve the investigation MDP for a case by DP over domain states
+    Returns a PolicyTable, or None if the case is too large to precompute
+    """
+    index = case['index']
+    sizes = [len(index.values[var]) for var in index.variables]
+    state_space = 1
+    for size in sizes:
+        state_space <<= size
+    if state_space > max_states:
+        return None
+
+    targets = _cheapest_evidence(case)
+    memo = {}
+
+    def solve(state):
+        if state in memo:
+            return memo[state][0]
+        if all(is_singleton(mask) for mask in state):
+            memo[state] = (0.0, 0)
+            return 0.0
+
+        best = (float('inf'), 0)
+        for pos, mask in enumerate(state):
+            size = count_values(mask)
+            if size <= 1:
+                continue
+            for bit, (cost, evidence_id) in targets[pos].items():
+                if not mask & bit:
+                    continue
+                confirm = state[:pos] + (bit,) + state[pos + 1:]
+                eliminate = state[:pos] + (mask & ~bit,) + state[pos + 1:]
+                expected = cost + (solve(confirm) + (size - 1) * solve(eliminate)) / size
+                if (expected, evidence_id) < best:
+                    best = (expected, evidence_id)
+        memo[state] = best
+        return best[0]
+
+    solve(tuple(index.full_masks[var] for var in index.variables))
+
+    table = PolicyTable(case['key'], index.variables, sizes, {})
+    table.entries = {table.pack(state): entry for state, entry in memo.items()}
+    return table
+
+def policy_path(case_key):
+    return os.path.join(POLICY_DIR, f"{case_key}.policy")
+
+
+# Case key -> PolicyTable (or None when the case must use live search), LRU order
+_policies = OrderedDict()
+_policies_lock = threading.Lock()
+
+def get_policy(case):
+    """
+    Policy table for a case: loaded from disk when built offline, otherwise
+    solved in memory if the case is very small. None means live search.
+    """
+    case_key = case.get('key')
+    if case_key is None:
+        return None
+    with _policies_lock:
+        if case_key in _policies:
+            _policies.move_to_end(case_key)
+            return _policies[case_key]
+
+    # Load or solve outside the lock so other cases' lookups aren't held up;
+    # two requests racing on a new case at worst do the same small work twice
+    path = policy_path(case_key)
+    if os.path.exists(path):
+        policy = PolicyTable.load(path)
+    else:
+        policy = solve_policy(case, MAX_LIVE_POLICY_STATES)
+
+    with _policies_lock:
+        _policies[case_key] = policy
+        _policies.move_to_end(case_key)
+        while len(_policies) > MAX_CACHED_POLICIES:
+            _policies.popitem(last=False)
+    return policy
+
+
+def main():
+    from models.case_generator import generate_case, standard_case
+
+    parser = argparse.ArgumentParser(description="Precompute the optimal investigation policy for a case")
+    parser.add_argument('--suspects', type=int)
+    parser.add_argument('--weapons', type=int)
+    parser.add_argument('--locations', type=int)
+    parser.add_argument('--evidence', type=int)
+    parser.add_argument('--seed', type=int, help="required for generated cases")
+    parser.add_argument('--out', help="output path (defaults to data/policies/<case key>.policy)")
+    args = parser.parse_args()
+
+    if args.suspects or args.weapons or args.locations or args.evidence:
+        if args.seed is None:
+            parser.error("generated cases need --seed so sessions can find the table")
+        case = generate_case(args.suspects or 3, args.weapons or 3, args.locations or 3, args.evidence, args.seed)
+    else:
+        case = standard_case()
+
+    table = solve_policy(case)
+    if table is None:
+        parser.error(f"case {case['key']} is too large to precompute (over {MAX_POLICY_STATES} states)")
+
+    out = args.out or policy_path(case['key'])
+    table.save(out)
+    start = table.state_of(case['index'].full_masks)
+    print(f"Wrote {len(table.entries)} states to {out} "
+          f"(expected cost from the start: {table.expected_cost(start):.2f})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Transposition table shared by the planners across sessions
+"""
+import threading
+from collections import OrderedDict
+
+# Bound on the items (ids, scores) held by all entries together: entries
+# of large cases weigh hundreds of items each, so counting entries alone
+# doesn't bound memory
+MAX_TABLE_ITEMS = 2_000_000
+
+
+class TranspositionTable:
+    """
+    Size-bounded LRU cache of planning results keyed by canonical state
+    Each entry has a weight (roughly the items in its key and value); the
+    least recently used entries are evicted past max_entries entries or
+    max_items total weight. Safe to share between request threads
+    """
+    def __init__(self, max_entries=50000, max_items=MAX_TABLE_ITEMS):
+        self.max_entries = max_entries
+        self.max_items = max_items
+        # key -> (value, weight)
+        self._entries = OrderedDict()
+        self._items = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Cached value for key (None on a miss)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, weight=1):
+        """Store value, evicting the least recently used entries when full"""
+        if weight > self.max_items:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._items -= previous[1]
+            self._entries[key] = (value, weight)
+            self._items += weight
+            while len(self._entries) > self.max_entries or self._items > self.max_items:
+                self._items -= self._entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._items = 0
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'items': self._items,
+                'max_items': self.max_items,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def canonical_state(case, masks, available_actions):
+    """
+    Canonical planning state: (case key, domain masks, remaining evidence ids)
+    Returns None for cases that can't be shared (unseeded generated cases)
+    """
+    if case.get('key') is None:
+        return None
+    index = case['index']
+    return (
+        case['key'],
+        tuple(masks[var] for var in index.variables),
+        frozenset(action['id'] for action in available_actions)
+    )
+
+def state_weight(state, value_items):
+    """Weight of a table entry: the state's evidence ids plus value_items"""
+    return 1 + len(state[2]) + value_items
+
+# One table for the whole process
+planning_table = TranspositionTable()
@@ -8,11 +8,12 @@ from models.game_state import GameState
 from algorithms.csp_solver import CSPSolver
 from algorithms.astar_search import AStarSearch
 from algorithms.minimax import InterrogationTree
+from models.session_store import SessionStore
 
 api = Blueprint('api', __name__)
 
-# Global game state (in production, use sessions or database)
-game_sessions = {}
+# Global game state (bounded, idle sessions expire)
+game_sessions = SessionStore('api')
 
 @api.route('/game/start', methods=['POST'])
 def start_game():
@@ -62,7 +63,7 @@ def take_action():
     game_state.take_action(evidence)
     
     # Run CSP solver
-    csp = CSPSolver(game_state.current_domains.copy(), game_state.constraints)
+    csp = CSPSolver(game_state.domain_masks, game_state.constraints, index=game_state.index)
     csp_result = csp.solve()
     csp.arc_consistency_step_by_step()
     
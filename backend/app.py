@@ -1,15 +1,22 @@
 """
 Main Flask application
 """
+import os
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
+from models import metrics
 from routes.game import game_bp
 from routes.ai import ai_bp
 
+PORT = int(os.environ.get('PORT', 5002))
+
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Per-route latency, size, in-flight and error metrics (served at /metrics)
+metrics.init_app(app)
+
 # Register blueprints
 app.register_blueprint(game_bp, url_prefix='/api/game')
 app.register_blueprint(ai_bp, url_prefix='/api/ai')
@@ -26,9 +33,17 @@ def home():
 def health():
     return jsonify({
         "status": "healthy", 
-        "port": 5002
+        "port": int(request.environ.get('SERVER_PORT') or PORT)
     })
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request metrics of this process in Prometheus text format"""
+    return Response(
+        metrics.request_metrics.render(),
+        mimetype='text/plain; version=0.0.4'
+    )
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
@@ -45,6 +60,6 @@ def internal_error(error):
 
 if __name__ == '__main__':
     print("🕵️ Starting AI Detective Backend Server...")
-    print("📡 Server running on http://localhost:5002")
+    print(f"📡 Server running on http://localhost:{PORT}")
     print("✅ CORS enabled for all origins")
-    app.run(debug=True, port=5002, host='0.0.0.0')
\ No newline at end of file
+    app.run(debug=True, port=PORT, host='0.0.0.0')
\ No newline at end of file
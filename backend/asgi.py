@@ -0,0 +1,229 @@
+"""
+ASGI serving mode: the Flask app behind an asyncio front end
+
+    uvicorn asgi:app --port 5002 --no-access-log
+    python asgi.py --port 5002
+
+Cheap endpoints run inline on the event loop; planning endpoints (A*
+search, auto-solve) run in a thread pool so they never hold up the loop.
+Requests on the same session are queued on an asyncio lock until their
+response starts. A cheap request whose session lock is held elsewhere
+(a background job or a stream between steps) is offloaded too, so the
+loop never waits on a session lock. Routes and payloads are exactly
+those of app.py.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from app import app as flask_app
+from models.session_store import SESSION_SHARED
+from routes.game import game_sessions
+
+# Endpoints that run a planner: served from the executor
+HEAVY_PATHS = (
+    '/api/ai/make-move',
+    '/api/ai/auto-solve',
+    '/api/ai/suggest',
+    '/api/ai/plan',
+)
+
+PLANNER_THREADS = int(os.environ.get('ASGI_PLANNER_THREADS', min(32, (os.cpu_count() or 1) * 4)))
+
+
+def is_heavy(path):
+    return path.startswith(HEAVY_PATHS)
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP request"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': SESSION_SHARED,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def session_of(body, query_string=b''):
+    """
+    session_id of a JSON request body, else of the query string
+    (EventSource streams are GETs) - None if absent
+    """
+    if body:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        session_id = data.get('session_id') if isinstance(data, dict) else None
+        if isinstance(session_id, str):
+            return session_id
+    values = parse_qs(query_string.decode('latin-1')).get('session_id')
+    return values[0] if values else None
+
+
+class AsyncApp:
+    """ASGI application wrapping a WSGI app"""
+
+    def __init__(self, wsgi_app, planner_threads=PLANNER_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=planner_threads, thread_name_prefix='planner')
+        # session_id -> [asyncio.Lock, waiters]
+        self._session_locks = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body = b''.join(chunks)
+
+        session_id = session_of(body, scope.get('query_string', b''))
+        # Shared sessions write through to SQLite, which may wait on other
+        # workers: never inline
+        offload = is_heavy(scope['path']) or (SESSION_SHARED and session_id is not None)
+        if session_id is None:
+            await self._respond(scope, body, send, offload)
+            return
+
+        entry = self._session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        session_lock = entry[0]
+        await session_lock.acquire()
+        held = [True]
+
+        def release():
+            # Once the response has started the request is done with the
+            # session (streams lock it per step), so the next one may run
+            if held[0]:
+                held[0] = False
+                session_lock.release()
+
+        try:
+            await self._respond(scope, body, send, offload, session_id, release)
+        finally:
+            release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._session_locks[session_id]
+
+    async def _respond(self, scope, body, send, offload, session_id=None, started_callback=None):
+        """
+        Run the WSGI app (inline or in the executor) and stream its response
+        Inline session requests try the session lock first and are
+        offloaded instead if another thread holds it
+        """
+        loop = asyncio.get_running_loop()
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        def call():
+            result = self.wsgi_app(build_environ(scope, body), start_response)
+            return result, iter(result)
+
+        def next_chunk(iterator):
+            return next(iterator, None)
+
+        if not offload and session_id is not None:
+            with game_sessions.lock(session_id, blocking=False) as acquired:
+                if acquired:
+                    result, iterator = call()
+            offload = not acquired
+        elif not offload:
+            result, iterator = call()
+        if offload:
+            result, iterator = await loop.run_in_executor(self.executor, call)
+
+        try:
+            started = False
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next_chunk, iterator) \
+                    if offload else next_chunk(iterator)
+                if not started:
+                    # Headers are only final once the first chunk was produced
+                    await send({
+                        'type': 'http.response.start',
+                        'status': response['status'],
+                        'headers': response['headers']
+                    })
+                    started = True
+                    if started_callback is not None:
+                        started_callback()
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+app = AsyncApp(flask_app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend in ASGI mode (needs uvicorn)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5002)
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        parser.error("ASGI mode needs uvicorn: pip install uvicorn")
+    uvicorn.run(app, host=args.host, port=args.port, access_log=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Timing and statistics for the micro-benchmarks
+"""
+import math
+import statistics
+import time
+
+
+def calibrate(setup, run, min_time=0.001, max_number=1000):
+    """Calls per timed batch so that a batch lasts at least min_time seconds"""
+    number = 1
+    while number < max_number:
+        if _time_batch(setup, run, number) >= min_time:
+            break
+        number *= 2
+    return min(number, max_number)
+
+def _time_batch(setup, run, number):
+    """Seconds taken by `number` calls, each on its own setup() arguments"""
+    batch = [setup() for _ in range(number)]
+    started = time.perf_counter()
+    for args in batch:
+        run(*args)
+    return time.perf_counter() - started
+
+def measure(setup, run, warmup=3, repeat=20, number=None):
+    """
+    Time run(*setup()) after `warmup` untimed calls
+    setup runs before every call and is not timed, so each call starts
+    from the same fresh state. Each of the `repeat` samples averages a batch
+    of `number` calls (calibrated to last about a millisecond when None),
+    which keeps timer resolution out of microsecond-scale results.
+    Returns (per-call durations in seconds, number)
+    """
+    for _ in range(warmup):
+        run(*setup())
+    if number is None:
+        number = calibrate(setup, run)
+    durations = [_time_batch(setup, run, number) / number for _ in range(repeat)]
+    return durations, number
+
+def summarize(durations):
+    """Statistics of a list of durations, in microseconds"""
+    values = sorted(d * 1e6 for d in durations)
+    mean = statistics.fmean(values)
+    stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+    return {
+        'runs': len(values),
+        'min_us': round(values[0], 2),
+        'median_us': round(statistics.median(values), 2),
+        'mean_us': round(mean, 2),
+        'stdev_us': round(stdev, 2),
+        'p95_us': round(values[min(len(values) - 1, math.ceil(0.95 * len(values)) - 1)], 2),
+        'max_us': round(values[-1], 2),
+        # Coefficient of variation: above ~0.1 the timings are noisy
+        'cv': round(stdev / mean, 3) if mean else 0.0,
+        'ops_per_second': round(1e6 / mean, 1) if mean else 0.0
+    }
+
+def compare(baseline, results, threshold=0.1):
+    """
+    Median ratios against a previous run (matched by benchmark and size)
+    Returns rows of (name, size, old_us, new_us, ratio, verdict)
+    """
+    old = {(r['benchmark'], r['size']): r['stats']['median_us'] for r in baseline['results']}
+    rows = []
+    for result in results:
+        key = (result['benchmark'], result['size'])
+        if key not in old:
+            continue
+        new = result['stats']['median_us']
+        ratio = new / old[key] if old[key] else float('inf')
+        if ratio > 1 + threshold:
+            verdict = 'slower'
+        elif ratio < 1 - threshold:
+            verdict = 'faster'
+        else:
+            verdict = ''
+        rows.append((key[0], key[1], old[key], new, ratio, verdict))
+    return rows
@@ -0,0 +1,217 @@
+"""
+Micro-benchmarks for the algorithms package, offline and without a server
+
+    python benchmarks/run.py                              # every benchmark, every size
+    python benchmarks/run.py --sizes standard,medium --repeat 50
+    python benchmarks/run.py --only csp --json results.json
+    python benchmarks/run.py --compare results.json       # medians vs an earlier run
+
+Each benchmark times calls on fresh states built by its (untimed) setup;
+a sample averages a batch of calls so microsecond timings stay stable.
+Case sizes are seeded generated cases, so runs on different builds
+measure identical work.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import compare, measure, summarize
+from algorithms.astar_search import AStarSearch
+from algorithms.csp_solver import CSPSolver
+from algorithms.hypothesis import np
+from algorithms.minimax import InterrogationTree
+from models.case_generator import generate_case, pick_solution, standard_case
+from routes.ai import SessionPlanningView
+from routes.game import apply_csp_constraints, build_game_state
+
+# name -> (suspects, weapons, locations, evidence); None is the built-in case
+SIZES = {
+    'standard': None,
+    'small': (5, 5, 5, None),
+    'medium': (8, 8, 8, 40),
+    'large': (12, 12, 12, 60),
+    # Far beyond the UI's cases: searches here are bounded by SEARCH_NODE_LIMIT
+    'huge': (50, 50, 50, None),
+}
+CASE_SEED = 1
+# Node budget of the full searches, so large cases finish in bounded time
+SEARCH_NODE_LIMIT = 5000
+
+
+def load_case(size):
+    params = SIZES[size]
+    if params is None:
+        return standard_case()
+    return generate_case(*params, seed=CASE_SEED)
+
+def fresh_state(case, seed=0):
+    """New session state with a reproducible hidden solution"""
+    return build_game_state(case, pick_solution(case, random.Random(seed)))
+
+def half_the_clues(game_state):
+    """Constraints of a fixed half of the evidence (a mid-game position)"""
+    actions = game_state['available_actions']
+    return [action['constraint'] for action in actions[::2] if action['constraint']]
+
+
+def bench_csp_solve(case):
+    """CSPSolver.solve: explicit constraints plus full AC-3 from the initial domains"""
+    game_state = fresh_state(case)
+    index = game_state['domain_index']
+    constraints = half_the_clues(game_state)
+
+    def setup():
+        return (CSPSolver(index.full(), constraints, index=index, record_steps=False),)
+    return setup, lambda solver: solver.solve()
+
+def bench_astar_search(case):
+    """AStarSearch.search: full A* plan from the start of a game"""
+    game_state = fresh_state(case)
+
+    def setup():
+        view = SessionPlanningView(game_state)
+        return (AStarSearch(view, view),)
+    return setup, lambda search: search.search('astar', SEARCH_NODE_LIMIT)
+
+def bench_astar_suggest(case):
+    """AStarSearch.suggest_next_action: one-step lookahead over every evidence item"""
+    game_state = fresh_state(case)
+
+    def setup():
+        view = SessionPlanningView(game_state)
+        return (AStarSearch(view, view),)
+    return setup, lambda search: search.suggest_next_action()
+
+def bench_minimax(case):
+    """InterrogationTree.get_best_question (fixed question set)"""
+    tree = InterrogationTree()
+    return (lambda: ()), tree.get_best_question
+
+def bench_apply_csp_constraints(case):
+    """apply_csp_constraints: one piece of evidence on a fresh session"""
+    def setup():
+        game_state = fresh_state(case)
+        evidence = next(a for a in game_state['available_actions'] if a['constraint'])
+        return game_state, evidence
+    return setup, apply_csp_constraints
+
+def bench_apply_csp_constraints_batch(case):
+    """apply_csp_constraints: half of the evidence in one propagation"""
+    def setup():
+        game_state = fresh_state(case)
+        return (game_state, *game_state['available_actions'][::2])
+    return setup, apply_csp_constraints
+
+# name -> (factory(case) -> (setup, run), sizes it runs on; None = every size)
+BENCHMARKS = {
+    'csp.solve': (bench_csp_solve, None),
+    'astar.search': (bench_astar_search, None),
+    'astar.suggest_next_action': (bench_astar_suggest, None),
+    'minimax.get_best_question': (bench_minimax, ('standard',)),
+    'game.apply_csp_constraints': (bench_apply_csp_constraints, None),
+    'game.apply_csp_constraints[batch]': (bench_apply_csp_constraints_batch, None),
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(names, sizes, warmup, repeat, number=None):
+    """Run the selected benchmarks; returns one result dict per (benchmark, size)"""
+    results = []
+    for name in names:
+        factory, only_sizes = BENCHMARKS[name]
+        for size in sizes:
+            if only_sizes is not None and size not in only_sizes:
+                continue
+            case = load_case(size)
+            setup, call = factory(case)
+            durations, calls = measure(setup, call, warmup, repeat, number)
+            stats = summarize(durations)
+            results.append({
+                'benchmark': name,
+                'size': size,
+                'case': case['name'],
+                'number': calls,
+                'stats': stats
+            })
+            print(f"{name:36} {size:9} {stats['median_us']:>12.1f} us  "
+                  f"(p95 {stats['p95_us']:.1f}, cv {stats['cv']:.2f}, x{calls})", file=sys.stderr)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the algorithms package")
+    parser.add_argument('--only', help="comma-separated benchmark name prefixes")
+    parser.add_argument('--sizes', default=','.join(SIZES), help=f"comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument('--warmup', type=int, default=3, help="untimed calls before measuring")
+    parser.add_argument('--repeat', type=int, default=20, help="timed samples per benchmark")
+    parser.add_argument('--number', type=int, help="calls averaged per sample (default: calibrated)")
+    parser.add_argument('--json', metavar='FILE', help="write the results as JSON ('-' for stdout)")
+    parser.add_argument('--compare', metavar='FILE', help="JSON of an earlier run to compare medians with")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative median change reported as faster/slower")
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (factory, _) in BENCHMARKS.items():
+            print(f"{name:36} {factory.__doc__}")
+        return 0
+
+    names = list(BENCHMARKS)
+    if args.only:
+        prefixes = args.only.split(',')
+        names = [name for name in names if name.startswith(tuple(prefixes))]
+    sizes = args.sizes.split(',')
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+    if not names:
+        parser.error("no benchmark matches --only")
+    if args.repeat < 1 or args.warmup < 0 or (args.number is not None and args.number < 1):
+        parser.error("--repeat and --number must be positive and --warmup not negative")
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__ if np is not None else None,
+            'warmup': args.warmup,
+            'repeat': args.repeat,
+            'search_node_limit': SEARCH_NODE_LIMIT
+        },
+        'results': run(names, sizes, args.warmup, args.repeat, args.number)
+    }
+
+    if args.json == '-':
+        print(json.dumps(report, indent=2))
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nvs {args.compare} (commit {baseline['meta'].get('commit')}):")
+        for name, size, old, new, ratio, verdict in compare(baseline, report['results'], args.threshold):
+            print(f"  {name:36} {size:9} {old:>12.1f} -> {new:>12.1f} us  x{ratio:.2f} {verdict}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
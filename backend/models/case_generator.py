@@ -0,0 +1,194 @@
+"""
+Case definitions: the standard 3x3x3 mansion case and a seeded generator
+for cases of arbitrary size
+"""
+import random
+from functools import lru_cache
+from algorithms.domains import DomainIndex
+from models.clue_rules import compile_evidence_rules
+
+# Standard case data
+SUSPECTS = ["Butler", "Chef", "Gardener"]
+WEAPONS = ["Knife", "Poison", "Rope"]
+LOCATIONS = ["Kitchen", "Library", "Garden"]
+
+EVIDENCE_LIST = [
+    {"id": 1, "action": "Question the Butler", "cost": 5},
+    {"id": 2, "action": "Search the Kitchen", "cost": 8},
+    {"id": 3, "action": "Examine the Knife", "cost": 6},
+    {"id": 4, "action": "Question the Chef", "cost": 5},
+    {"id": 5, "action": "Search the Library", "cost": 8},
+    {"id": 6, "action": "Examine the Poison", "cost": 6},
+    {"id": 7, "action": "Question the Gardener", "cost": 5},
+    {"id": 8, "action": "Search the Garden", "cost": 8},
+    {"id": 9, "action": "Examine the Rope", "cost": 6},
+    {"id": 10, "action": "Check alibis", "cost": 10},
+    {"id": 11, "action": "Review security footage", "cost": 12},
+    {"id": 12, "action": "Analyze fingerprints", "cost": 10},
+]
+
+# Generated cases: how each variable is investigated and what the clues say
+GENERATED_TEMPLATES = {
+    'suspect': {
+        'label': 'Suspect',
+        'direct': "Question {value}",
+        'extra': "Check {value}'s alibi",
+        'cost': (4, 7),
+        'clues': {
+            'confirm': "{value} cannot account for their whereabouts.",
+            'eliminate': "{value} has a verified alibi."
+        }
+    },
+    'weapon': {
+        'label': 'Weapon',
+        'direct': "Examine {value}",
+        'extra': "Send {value} to the lab",
+        'cost': (5, 8),
+        'clues': {
+            'confirm': "{value} shows signs of recent use.",
+            'eliminate': "{value} is untouched."
+        }
+    },
+    'location': {
+        'label': 'Location',
+        'direct': "Search {value}",
+        'extra': "Canvass witnesses near {value}",
+        'cost': (6, 10),
+        'clues': {
+            'confirm': "Signs of struggle found in {value}.",
+            'eliminate': "{value} appears undisturbed."
+        }
+    }
+}
+
+MAX_DOMAIN_SIZE = 1000
+MAX_EVIDENCE = 10000
+
+
+def _build_case(name, domains, evidence, rules, key=None, params=None):
+    """
+    Bundle a case definition shared by every session playing it
+    key: stable identity for cross-session caches (None if not shareable)
+    params: generate_case arguments that rebuild a keyed generated case
+    """
+    return {
+        'name': name,
+        'key': key,
+        'params': params,
+        'domains': domains,
+        'evidence': evidence,
+        'rules': rules,
+        'index': DomainIndex(domains),
+        'total_solutions': len(domains['suspect']) * len(domains['weapon']) * len(domains['location'])
+    }
+
+@lru_cache(maxsize=1)
+def standard_case():
+    """The built-in mansion case"""
+    return _build_case(
+        'standard',
+        {'suspect': SUSPECTS, 'weapon': WEAPONS, 'location': LOCATIONS},
+        EVIDENCE_LIST,
+        compile_evidence_rules(EVIDENCE_LIST),
+        key='standard'
+    )
+
+def _generated_rule(variable, value):
+    """Clue rule for a generated evidence item targeting (variable, value)"""
+    clues = GENERATED_TEMPLATES[variable]['clues']
+    return {
+        'keywords': (),
+        'target': (variable, value),
+        'clues': {
+            action_type: text.format(value=value)
+            for action_type, text in clues.items()
+        }
+    }
+
+def generate_case(num_suspects=3, num_weapons=3, num_locations=3, num_evidence=None, seed=None):
+    """
+    Generate a consistent case of arbitrary size
+    Every value gets one direct piece of evidence (so the case is always
+    solvable when num_evidence covers them); any extra evidence re-checks
+    random values. Same parameters and seed always give the same case.
+    num_evidence: total evidence count (defaults to one per value)
+    """
+    sizes = {'suspect': num_suspects, 'weapon': num_weapons, 'location': num_locations}
+    for variable, size in sizes.items():
+        if not isinstance(size, int) or not 1 <= size <= MAX_DOMAIN_SIZE:
+            raise ValueError(f"Number of {variable}s must be between 1 and {MAX_DOMAIN_SIZE}")
+    if num_evidence is None:
+        num_evidence = sum(sizes.values())
+    if not isinstance(num_evidence, int) or not 1 <= num_evidence <= MAX_EVIDENCE:
+        raise ValueError(f"Number of evidence items must be between 1 and {MAX_EVIDENCE}")
+    if seed is not None and not isinstance(seed, int):
+        raise ValueError("Seed must be an integer")
+
+    if seed is None:
+        # Still seeded (not cached): persisted sessions store the parameters
+        # and the seed instead of the whole case definition
+        seed = random.randrange(1 << 63)
+        return _generate_case(sizes, num_evidence, random.Random(seed), seed)
+    return _cached_case(num_suspects, num_weapons, num_locations, num_evidence, seed)
+
+@lru_cache(maxsize=32)
+def _cached_case(num_suspects, num_weapons, num_locations, num_evidence, seed):
+    """Seeded cases are deterministic, so sessions can share them"""
+    sizes = {'suspect': num_suspects, 'weapon': num_weapons, 'location': num_locations}
+    return _generate_case(sizes, num_evidence, random.Random(seed), seed)
+
+def _generate_case(sizes, num_evidence, rng, seed=None):
+    domains = {
+        variable: [f"{GENERATED_TEMPLATES[variable]['label']} {i + 1}" for i in range(size)]
+        for variable, size in sizes.items()
+    }
+
+    # One direct check per value, then extra checks on random values
+    targets = [(variable, value, 'direct') for variable, values in domains.items() for value in values]
+    rng.shuffle(targets)
+    targets = targets[:num_evidence]
+    while len(targets) < num_evidence:
+        variable = rng.choice(list(domains))
+        targets.append((variable, rng.choice(domains[variable]), 'extra'))
+
+    evidence = []
+    rules = {}
+    for evidence_id, (variable, value, kind) in enumerate(targets, start=1):
+        template = GENERATED_TEMPLATES[variable]
+        evidence.append({
+            "id": evidence_id,
+            "action": template[kind].format(value=value),
+            "cost": rng.randint(*template['cost'])
+        })
+        rules[evidence_id] = _generated_rule(variable, value)
+
+    name = f"generated-{sizes['suspect']}x{sizes['weapon']}x{sizes['location']}-{num_evidence}"
+    if seed is None:
+        return _build_case(name, domains, evidence, rules)
+    params = (sizes['suspect'], sizes['weapon'], sizes['location'], num_evidence, seed)
+    return _build_case(name, domains, evidence, rules, f"{name}-seed{seed}", params)
+
+def case_spec(case):
+    """Compact description of a case for persisted sessions"""
+    if case['key'] == 'standard':
+        return ('standard',)
+    if case['params'] is not None:
+        return ('generated',) + case['params']
+    # Unseeded cases can't be regenerated, so the definition itself is kept
+    return ('custom', case['name'], case['domains'], case['evidence'], case['rules'])
+
+def case_from_spec(spec):
+    """Rebuild (or fetch the shared copy of) a case from case_spec()"""
+    kind = spec[0]
+    if kind == 'standard':
+        return standard_case()
+    if kind == 'generated':
+        return generate_case(*spec[1:])
+    return _build_case(*spec[1:])
+
+def pick_solution(case, rng=random):
+    """Choose the hidden solution of a case"""
+    return {
+        variable: rng.choice(values)
+        for variable, values in case['domains'].items()
+    }
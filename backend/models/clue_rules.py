@@ -0,0 +1,167 @@
+"""
+Clue rules: what each investigation action reveals about the case
+Keyword rules are compiled once into a dispatch table, and every evidence
+item gets its clue text and structured constraint when the case is built
+"""
+
+# Keyword rules: an action mentioning one of the keywords targets
+# (variable, value); its clue depends on whether that value is the solution
+CLUE_RULES = [
+    {
+        'keywords': ('butler',),
+        'target': ('suspect', 'Butler'),
+        'clues': {
+            'confirm': "The Butler seems nervous and avoids eye contact.",
+            'eliminate': "The Butler has a solid alibi."
+        }
+    },
+    {
+        'keywords': ('chef',),
+        'target': ('suspect', 'Chef'),
+        'clues': {
+            'confirm': "The Chef was seen near the crime scene.",
+            'eliminate': "The Chef was in the kitchen all evening."
+        }
+    },
+    {
+        'keywords': ('gardener',),
+        'target': ('suspect', 'Gardener'),
+        'clues': {
+            'confirm': "The Gardener's tools are missing.",
+            'eliminate': "The Gardener was working outside."
+        }
+    },
+    {
+        'keywords': ('kitchen',),
+        'target': ('location', 'Kitchen'),
+        'clues': {
+            'confirm': "Signs of struggle found in the Kitchen.",
+            'eliminate': "The Kitchen appears undisturbed."
+        }
+    },
+    {
+        'keywords': ('library',),
+        'target': ('location', 'Library'),
+        'clues': {
+            'confirm': "Books are scattered in the Library.",
+            'eliminate': "The Library is pristine."
+        }
+    },
+    {
+        'keywords': ('garden',),
+        'target': ('location', 'Garden'),
+        'clues': {
+            'confirm': "Footprints found in the Garden.",
+            'eliminate': "The Garden shows no signs of disturbance."
+        }
+    },
+    {
+        'keywords': ('knife',),
+        'target': ('weapon', 'Knife'),
+        'clues': {
+            'confirm': "The Knife has traces of blood.",
+            'eliminate': "The Knife is clean."
+        }
+    },
+    {
+        'keywords': ('poison',),
+        'target': ('weapon', 'Poison'),
+        'clues': {
+            'confirm': "Poison bottle found partially empty.",
+            'eliminate': "Poison bottle is sealed and full."
+        }
+    },
+    {
+        'keywords': ('rope',),
+        'target': ('weapon', 'Rope'),
+        'clues': {
+            'confirm': "Rope shows signs of recent use.",
+            'eliminate': "The Rope is neatly coiled and unused."
+        }
+    },
+    # Flavour evidence: no constraint, clue may mention the solution
+    {
+        'keywords': ('alibi', 'alibis'),
+        'target': None,
+        'clue': "One suspect's alibi doesn't check out."
+    },
+    {
+        'keywords': ('footage',),
+        'target': None,
+        'clue': "Camera shows someone near the {location}."
+    },
+    {
+        'keywords': ('fingerprint', 'fingerprints'),
+        'target': None,
+        'clue': "Fingerprints match someone who frequents the {location}."
+    },
+]
+
+DEFAULT_RULE = {
+    'keywords': (),
+    'target': None,
+    'clue': "Investigation reveals some useful information."
+}
+
+# Explanation shown when a constraint is applied: (variable, action_type) -> step
+STEP_TEMPLATES = {
+    ('suspect', 'confirm'): ('Confirmation', "Strong evidence points to {value} as suspect"),
+    ('suspect', 'eliminate'): ('Elimination', "{value} eliminated as suspect due to alibi"),
+    ('location', 'confirm'): ('Confirmation', "Evidence confirms {value} as crime location"),
+    ('location', 'eliminate'): ('Elimination', "{value} eliminated as crime location"),
+    ('weapon', 'confirm'): ('Confirmation', "Evidence confirms {value} as murder weapon"),
+    ('weapon', 'eliminate'): ('Elimination', "{value} eliminated as murder weapon"),
+}
+
+STEP_TYPES = {
+    'confirm': 'confirmation',
+    'eliminate': 'elimination'
+}
+
+
+def compile_rules(rules):
+    """Turn keyword rules into a keyword -> rule dispatch table"""
+    dispatch = {}
+    for rule in rules:
+        for keyword in rule['keywords']:
+            dispatch[keyword] = rule
+    return dispatch
+
+def match_rule(action, dispatch):
+    """Find the rule for an action text (one dict lookup per word)"""
+    for word in action.lower().split():
+        rule = dispatch.get(word)
+        if rule is not None:
+            return rule
+    return DEFAULT_RULE
+
+def compile_evidence_rules(evidence_list, rules=CLUE_RULES):
+    """Resolve the rule of every evidence item once: {evidence_id: rule}"""
+    dispatch = compile_rules(rules)
+    return {
+        evidence['id']: match_rule(evidence['action'], dispatch)
+        for evidence in evidence_list
+    }
+
+def resolve_clue(rule, solution):
+    """
+    Clue text and structured constraint of a rule for a given solution
+    Returns (clue_text, constraint) where constraint is a
+    (variable, value, action_type) tuple or None
+    """
+    if rule['target'] is None:
+        return rule['clue'].format(**solution), None
+
+    variable, value = rule['target']
+    action_type = 'confirm' if solution[variable] == value else 'eliminate'
+    return rule['clues'][action_type], (variable, value, action_type)
+
+def describe_constraint(constraint):
+    """Visualization step for an applied constraint"""
+    variable, value, action_type = constraint
+    step, message = STEP_TEMPLATES[(variable, action_type)]
+    return {
+        'step': step,
+        'message': message.format(value=value),
+        'type': STEP_TYPES[action_type]
+    }
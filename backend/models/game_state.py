@@ -1,15 +1,15 @@
 """
 Game state management
 """
+from algorithms.domains import DomainIndex, count_solutions
+from algorithms.hypothesis import HypothesisSpace
 
 class GameState:
     def __init__(self, case_data):
         self.case_data = case_data
-        self.current_domains = {
-            'suspect': case_data.domains['suspect'].copy(),
-            'weapon': case_data.domains['weapon'].copy(),
-            'location': case_data.domains['location'].copy()
-        }
+        self.index = DomainIndex(case_data.domains)
+        self.domain_masks = self.index.full()
+        self.hypotheses = HypothesisSpace.for_index(self.index)
         self.constraints = []
         self.actions_taken = []
         self.total_cost = 0
@@ -22,17 +22,16 @@ class GameState:
         # Handle eliminates
         if 'eliminates' in constraint:
             for var_type, values in constraint['eliminates'].items():
-                if var_type in self.current_domains:
-                    for val in values:
-                        if val in self.current_domains[var_type]:
-                            self.current_domains[var_type].remove(val)
+                if var_type in self.domain_masks:
+                    self.domain_masks[var_type] &= ~self.index.mask_of(var_type, values)
         
         # Handle confirms (keep only confirmed values)
         if 'confirms' in constraint:
             for var_type, value in constraint['confirms'].items():
-                if var_type in self.current_domains:
-                    if value in self.current_domains[var_type]:
-                        self.current_domains[var_type] = [value]
+                if var_type in self.domain_masks:
+                    bit = self.index.bit(var_type, value)
+                    if self.domain_masks[var_type] & bit:
+                        self.domain_masks[var_type] = bit
     
     def take_action(self, evidence):
         """Take an investigation action"""
@@ -47,11 +46,17 @@ class GameState:
                 guess['weapon'] == solution['weapon'] and
                 guess['location'] == solution['location'])
     
+    @property
+    def current_domains(self):
+        """List view of the current domains"""
+        return self.index.decode(self.domain_masks)
+    
     def get_possible_solutions_count(self):
         """Count remaining possible combinations"""
-        return (len(self.current_domains['suspect']) *
-                len(self.current_domains['weapon']) *
-                len(self.current_domains['location']))
+        if self.hypotheses is not None:
+            self.hypotheses.apply_masks(self.domain_masks)
+            return self.hypotheses.count()
+        return count_solutions(self.domain_masks)
     
     def to_dict(self):
         """Convert state to dictionary for API response"""
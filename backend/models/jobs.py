@@ -0,0 +1,269 @@
+"""
+Bounded background job runner for long planning requests (auto-solve,
+full A* plans): clients get a job id at once and poll for the result
+
+With shared sessions (several worker processes), job status and results
+also go to a SQLite table next to the sessions, so any worker can answer
+a poll or forward a cancel to the worker running the job
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from models.session_store import SESSION_DB, SESSION_SHARED
+
+# Few workers on purpose: planning shares the CPU with interactive requests
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Queued + running jobs accepted before new submissions are refused
+MAX_PENDING_JOBS = int(os.environ.get('MAX_PENDING_JOBS', 64))
+# Finished jobs kept around for polling
+JOB_HISTORY = 1000
+# Seconds a finished job stays pollable in the shared store
+JOB_TTL = 3600
+
+
+class QueueFull(Exception):
+    """Too many jobs pending; the client should retry later"""
+
+
+class Job:
+    """One background job and what pollers can see of it"""
+
+    def __init__(self, kind, session_id, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.session_id = session_id
+        self.status = 'queued'
+        self._progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._future = None
+        self._store = store
+
+    @classmethod
+    def from_dict(cls, data):
+        """Read-only copy of a job another worker runs (from JobStore)"""
+        job = cls(data['kind'], data['session_id'])
+        job.id = data['job_id']
+        job.status = data['status']
+        job._progress = data['progress']
+        job.result = data.get('result')
+        job.error = data.get('error')
+        job.created = data['created']
+        job.started = data['started']
+        job.finished = data['finished']
+        return job
+
+    @property
+    def progress(self):
+        return self._progress
+
+    @progress.setter
+    def progress(self, progress):
+        self._progress = progress
+        self.save()
+
+    @property
+    def cancelled(self):
+        """Checked by job functions between steps (and cancels sent through the store)"""
+        if not self._cancel.is_set() and self._store is not None and self._store.cancel_requested(self.id):
+            self._cancel.set()
+        return self._cancel.is_set()
+
+    def save(self):
+        """Publish the job's state to the shared store, if any"""
+        if self._store is not None:
+            self._store.save(self)
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def to_dict(self, include_result=False):
+        job = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'session_id': self.session_id,
+            'status': self.status,
+            'progress': self.progress,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+        if self.error:
+            job['error'] = self.error
+        if include_result and self.done:
+            job['result'] = self.result
+        return job
+
+
+class JobStore:
+    """
+    Job status, results and cancel requests in SQLite, shared between
+    worker processes; safe to share between threads
+    """
+
+    def __init__(self, path, ttl=JOB_TTL):
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL, "
+                "cancel INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def save(self, job):
+        data = json.dumps(job.to_dict(include_result=True))
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, data, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                (job.id, data, now)
+            )
+            if job.done:
+                self._db.execute("DELETE FROM jobs WHERE updated < ?", (now - self.ttl,))
+
+    def load(self, job_id):
+        """Job as last published by its worker (None if unknown)"""
+        with self._db_lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return Job.from_dict(json.loads(row[0])) if row else None
+
+    def request_cancel(self, job_id):
+        """Flag a job for cancelling; True if it exists"""
+        with self._db_lock:
+            cursor = self._db.execute("UPDATE jobs SET cancel = 1 WHERE job_id = ?", (job_id,))
+        return cursor.rowcount > 0
+
+    def cancel_requested(self, job_id):
+        with self._db_lock:
+            row = self._db.execute("SELECT cancel FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+
+class JobQueue:
+    """
+    Thread pool with a cap on pending jobs and a bounded job history
+    store: JobStore through which other worker processes see the jobs
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS, history=JOB_HISTORY, store=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.history = history
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+
+    def submit(self, kind, session_id, fn):
+        """
+        Queue fn(job), whose return value becomes the job's result
+        Raises QueueFull when max_pending jobs are already waiting or running
+        """
+        job = Job(kind, session_id, self.store)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self._pending} jobs pending")
+            self._pending += 1
+            self.submitted += 1
+            self._jobs[job.id] = job
+            self._prune()
+        job.save()
+        job._future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        if job.cancelled:
+            self._finish(job, 'cancelled')
+            return
+        job.status = 'running'
+        job.started = time.time()
+        job.save()
+        try:
+            job.result = fn(job)
+            self._finish(job, 'cancelled' if job.cancelled else 'succeeded')
+        except Exception as e:
+            job.error = f'Error: {str(e)}'
+            self._finish(job, 'failed')
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        with self._lock:
+            self._pending -= 1
+        job.save()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond the history size"""
+        excess = len(self._jobs) - self.history - self._pending
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].done:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def get(self, job_id):
+        """Job of this process, else as published by another worker (None if unknown)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Ask a job to stop: queued jobs never start, running ones stop at
+        their next step. Returns the job (None if unknown)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            # Run by another worker: it sees the flag at its next step
+            if self.store is None or not self.store.request_cancel(job_id):
+                return None
+            return self.store.load(job_id)
+        if job.done:
+            return job
+        job._cancel.set()
+        if job._future.cancel():
+            # Never started, so _run won't finish it
+            self._finish(job, 'cancelled')
+        return job
+
+    def stats(self):
+        with self._lock:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {
+                'shared': self.store is not None,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'jobs': statuses
+            }
+
+# One queue per process; with shared sessions its jobs are visible to every worker
+job_queue = JobQueue(store=JobStore(SESSION_DB) if SESSION_SHARED else None)
@@ -0,0 +1,165 @@
+"""
+In-memory request metrics in Prometheus text format: per-route latency and
+response-size histograms, in-flight gauges and error counters
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+# Upper bounds of the histogram buckets (+Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+# Label for requests that matched no route (keeps label cardinality bounded)
+UNMATCHED = 'unmatched'
+
+
+class Histogram:
+    """Cumulative-bucket histogram; callers hold the registry lock"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """Exposition lines: cumulative buckets, then _sum and _count"""
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class RequestMetrics:
+    """Metrics keyed by (method, route template), safe to share between request threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.sizes = {}
+        self.requests = {}
+        self.errors = {}
+        self.in_flight = {}
+
+    def started(self, key):
+        with self._lock:
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def finished(self, key, status, seconds, size):
+        """Record a completed request (size None when unknown)"""
+        with self._lock:
+            self.in_flight[key] -= 1
+            latency = self.latency.get(key)
+            if latency is None:
+                latency = self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.sizes[key] = Histogram(SIZE_BUCKETS)
+            latency.observe(seconds)
+            if size is not None:
+                self.sizes[key].observe(size)
+            counter = key + (status,)
+            self.requests[counter] = self.requests.get(counter, 0) + 1
+            if status >= 400:
+                self.errors[counter] = self.errors.get(counter, 0) + 1
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                '# HELP http_request_duration_seconds Time to produce a response (streams: until the last byte)',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for key, histogram in sorted(self.latency.items()):
+                lines += histogram.lines('http_request_duration_seconds', _labels(*key))
+            lines += [
+                '# HELP http_response_size_bytes Size of response bodies',
+                '# TYPE http_response_size_bytes histogram',
+            ]
+            for key, histogram in sorted(self.sizes.items()):
+                lines += histogram.lines('http_response_size_bytes', _labels(*key))
+            lines += [
+                '# HELP http_requests_in_flight Requests being handled',
+                '# TYPE http_requests_in_flight gauge',
+            ]
+            lines += [f'http_requests_in_flight{{{_labels(*key)}}} {n}' for key, n in sorted(self.in_flight.items())]
+            lines += [
+                '# HELP http_requests_total Completed requests',
+                '# TYPE http_requests_total counter',
+            ]
+            lines += [
+                f'http_requests_total{{{_labels(method, route)},status="{status}"}} {n}'
+                for (method, route, status), n in sorted(self.requests.items())
+            ]
+            lines += [
+                '# HELP http_request_errors_total Requests answered with a 4xx or 5xx status',
+                '# TYPE http_request_errors_total counter',
+            ]
+            lines += [
+                f'http_request_errors_total{{{_labels(method, route)},status="{status}"}} {n}'
+                for (method, route, status), n in sorted(self.errors.items())
+            ]
+        return '\n'.join(lines) + '\n'
+
+def _labels(method, route):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+def _counted(chunks, sent):
+    """Pass a streamed body through, adding its size in bytes to sent[0]"""
+    try:
+        for chunk in chunks:
+            sent[0] += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+# One registry for the whole process
+request_metrics = RequestMetrics()
+
+
+def init_app(app, metrics=request_metrics):
+    """Time every request of a Flask app"""
+
+    @app.before_request
+    def start_timer():
+        rule = request.url_rule
+        g.metrics_key = (request.method, rule.rule if rule is not None else UNMATCHED)
+        g.metrics_started = time.perf_counter()
+        metrics.started(g.metrics_key)
+
+    @app.after_request
+    def record(response):
+        key = g.pop('metrics_key', None)
+        if key is None:
+            return response
+        started = g.metrics_started
+        status = response.status_code
+        if not response.is_streamed:
+            metrics.finished(key, status, time.perf_counter() - started, response.calculate_content_length())
+            return response
+
+        # Streams (auto-solve SSE) count as in flight until their body is sent
+        sent = [0]
+        response.response = _counted(response.response, sent)
+        response.call_on_close(
+            lambda: metrics.finished(key, status, time.perf_counter() - started, sent[0])
+        )
+        return response
+
+    @app.teardown_request
+    def release(error):
+        # after_request is skipped when a response could not be built
+        key = g.pop('metrics_key', None)
+        if key is not None:
+            metrics.finished(key, 500, time.perf_counter() - g.metrics_started, None)
@@ -0,0 +1,535 @@
+"""
+Bounded session storage with idle TTL and LRU eviction, kept in memory or
+persisted to SQLite with a read-through cache and write-behind batching
+"""
+import atexit
+import contextlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; shared mode needs it
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable per deployment through the environment
+DEFAULT_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', 10000))
+DEFAULT_TTL = float(os.environ.get('SESSION_TTL_SECONDS', 3600))
+SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_SECONDS', 60))
+
+# Persistent backend: SESSION_BACKEND=sqlite stores sessions in SESSION_DB
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+SESSION_DB = os.environ.get(
+    'SESSION_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'sessions.db')
+)
+FLUSH_INTERVAL = float(os.environ.get('SESSION_FLUSH_SECONDS', 0.5))
+FLUSH_BATCH = 256
+
+# SESSION_SHARED=1: several worker processes use the same SESSION_DB
+SESSION_SHARED = os.environ.get('SESSION_SHARED', '0') == '1'
+LOCK_STRIPES = 1024
+
+
+class SessionConflict(Exception):
+    """A session changed in another process while it was being updated"""
+
+
+class SessionStore:
+    """
+    Dict-like session map: entries idle longer than ttl expire, and the
+    least recently used entry is evicted when max_entries is exceeded
+    Safe to share between request threads
+    """
+    def __init__(self, name, max_entries=None, ttl=None):
+        self.name = name
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else DEFAULT_TTL
+        # session_id -> (value, last access time), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._listeners = []
+        # session_id -> [RLock, holders]: one lock per session in use
+        self._session_locks = {}
+        self.expired = 0
+        self.evicted = 0
+        self.lock_waits = 0
+        _register(self)
+
+    def on_evict(self, callback):
+        """Call callback(session_id) whenever an entry expires or is evicted"""
+        self._listeners.append(callback)
+
+    def _notify(self, session_ids):
+        for session_id in session_ids:
+            for callback in self._listeners:
+                callback(session_id)
+
+    def get(self, session_id, default=None):
+        """Value for session_id, refreshing its idle timer"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return default
+            if now - entry[1] <= self.ttl:
+                self._entries[session_id] = (entry[0], now)
+                self._entries.move_to_end(session_id)
+                return entry[0]
+            del self._entries[session_id]
+            self.expired += 1
+        self._notify([session_id])
+        return default
+
+    def __getitem__(self, session_id):
+        value = self.get(session_id)
+        if value is None:
+            raise KeyError(session_id)
+        return value
+
+    def __setitem__(self, session_id, value):
+        evicted = []
+        with self._lock:
+            self._entries[session_id] = (value, time.monotonic())
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+                self.evicted += 1
+        self._on_evicted(evicted)
+
+    def _on_evicted(self, session_ids):
+        """LRU eviction drops the sessions for good in a memory-only store"""
+        self._notify(session_ids)
+
+    def mark_dirty(self, session_id, value):
+        """
+        Record that value, session_id's session, was mutated in place
+        (persistent stores write it back, even if it left the cache meanwhile)
+        """
+
+    @contextlib.contextmanager
+    def lock(self, session_id, blocking=True):
+        """
+        Exclusive access to one session for a read-modify-write sequence
+        Re-entrant within a thread; requests on other sessions never wait
+        Yields whether the lock is held: with blocking=False it yields False
+        at once, instead of waiting, when another thread holds the session
+        """
+        with self._lock:
+            entry = self._session_locks.get(session_id)
+            if entry is None:
+                entry = self._session_locks[session_id] = [threading.RLock(), 0]
+            entry[1] += 1
+        session_lock = entry[0]
+        acquired = session_lock.acquire(blocking=False)
+        if not acquired and blocking:
+            with self._lock:
+                self.lock_waits += 1
+            acquired = session_lock.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                session_lock.release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._session_locks[session_id]
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __delitem__(self, session_id):
+        with self._lock:
+            del self._entries[session_id]
+
+    def pop(self, session_id, default=None):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        return default if entry is None else entry[0]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def sweep(self):
+        """Drop every expired entry; returns how many were removed"""
+        cutoff = time.monotonic() - self.ttl
+        expired = []
+        with self._lock:
+            # Entries are ordered by last access, so expired ones come first
+            for session_id, (_, accessed) in self._entries.items():
+                if accessed >= cutoff:
+                    break
+                expired.append(session_id)
+            for session_id in expired:
+                del self._entries[session_id]
+            self.expired += len(expired)
+        self._notify(expired)
+        return len(expired)
+
+    def stats(self):
+        """Size and eviction counters for monitoring"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'locked_sessions': len(self._session_locks),
+                'lock_waits': self.lock_waits
+            }
+
+
+# Every live store, swept by one background thread
+_stores = weakref.WeakSet()
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+def _register(store):
+    global _sweeper
+    _stores.add(store)
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, name='session-sweeper', daemon=True)
+            _sweeper.start()
+
+def _sweep_forever():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        for store in list(_stores):
+            store.sweep()
+
+def all_stats():
+    """Stats of every session store in the process"""
+    return sorted((store.stats() for store in list(_stores)), key=lambda s: s['name'])
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store persisted to SQLite
+    The in-memory LRU acts as a read-through cache of decoded sessions;
+    changes are written behind in batches by a flusher thread, so request
+    latency stays that of the in-memory store
+    codec: (encode, decode) between session objects and picklable data
+    shared: the database is shared with other worker processes. Writes go
+            through immediately with a version compare-and-swap, cached
+            sessions are revalidated against the stored version, and lock()
+            also takes a cross-process file lock
+    """
+    def __init__(self, name, path, codec, max_entries=None, ttl=None,
+                 flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH, shared=False):
+        super().__init__(name, max_entries, ttl)
+        self.path = path
+        self.encode, self.decode = codec
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.shared = shared
+        # session_id -> serialized value waiting to be written
+        self._dirty = {}
+        # session_id -> stored version of the cached copy
+        self._versions = {}
+        self._load_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self.loads = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(sessions)")]
+            if 'version' not in columns:
+                self._db.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+        if shared:
+            if fcntl is None:
+                raise RuntimeError("Shared session stores need fcntl file locks")
+            # One byte-range lock per stripe of session ids, plus the
+            # in-process lock that keeps threads of this worker apart
+            self._lock_file = open(path + '.locks', 'a+b')
+            self._stripe_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+            self._stripe_depth = [0] * LOCK_STRIPES
+
+        self._flusher = threading.Thread(target=self._flush_forever, name=f'{name}-flusher', daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _on_evicted(self, session_ids):
+        """
+        Only dropped from the cache: the sessions live on in the database.
+        Their versions stay until sweep(), so a request still holding an
+        evicted session can write it back through mark_dirty
+        """
+
+    def get(self, session_id, default=None):
+        value = super().get(session_id)
+        if value is not None and (not self.shared or self._is_current(session_id)):
+            return value
+        with self._load_lock:
+            # Another thread may have loaded it while we waited
+            value = super().get(session_id)
+            if value is not None and self.shared and not self._is_current(session_id):
+                value = None
+            if value is None:
+                data = self._dirty.get(session_id)
+                value = self._deserialize(data) if data is not None else None
+            if value is None:
+                value, version = self._load(session_id)
+                if value is None:
+                    super().pop(session_id)
+                    return default
+                self._versions[session_id] = version
+            super().__setitem__(session_id, value)
+            return value
+
+    def _is_current(self, session_id):
+        """True if no other worker wrote the session since it was cached"""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None and row[0] == self._versions.get(session_id)
+
+    def _load(self, session_id):
+        """(session, version) from the database, (None, None) if absent or expired"""
+        cutoff = time.time() - self.ttl
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT data, version FROM sessions WHERE session_id = ? AND updated >= ?",
+                (session_id, cutoff)
+            ).fetchone()
+        if row is None:
+            return None, None
+        self.loads += 1
+        return self._deserialize(row[0]), row[1]
+
+    def _serialize(self, value):
+        return zlib.compress(pickle.dumps(self.encode(value), pickle.HIGHEST_PROTOCOL))
+
+    def _deserialize(self, data):
+        return self.decode(pickle.loads(zlib.decompress(data)))
+
+    def __setitem__(self, session_id, value):
+        super().__setitem__(session_id, value)
+        if self.shared:
+            self._write(session_id, value, replace=True)
+        else:
+            self._queue(session_id, value)
+
+    def mark_dirty(self, session_id, value):
+        # The caller's object, not a cache lookup: the session may have been
+        # evicted since it was read, and its changes must still be written
+        if self.shared:
+            self._write(session_id, value)
+        else:
+            self._queue(session_id, value)
+
+    def _write(self, session_id, value, replace=False):
+        """
+        Write one session through (shared mode)
+        Updates compare-and-swap on the version the cached copy was loaded
+        at; replace overwrites whatever is stored (a new game)
+        """
+        data = self._serialize(value)
+        now = time.time()
+        with self._db_lock:
+            if replace:
+                version = self._db.execute(
+                    "INSERT INTO sessions (session_id, data, updated, version) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, "
+                    "updated = excluded.updated, version = sessions.version + 1 "
+                    "RETURNING version",
+                    (session_id, data, now)
+                ).fetchall()[0][0]
+            else:
+                expected = self._versions.get(session_id, 0)
+                cursor = self._db.execute(
+                    "UPDATE sessions SET data = ?, updated = ?, version = version + 1 "
+                    "WHERE session_id = ? AND version = ?",
+                    (data, now, session_id, expected)
+                )
+                if cursor.rowcount == 0:
+                    super().pop(session_id)
+                    raise SessionConflict(f"Session {session_id} was modified by another worker")
+                version = expected + 1
+        self._versions[session_id] = version
+        self.rows_written += 1
+
+    @contextlib.contextmanager
+    def lock(self, session_id, blocking=True):
+        """
+        Exclusive access to one session across threads and, in shared mode,
+        across worker processes (re-entrant within a thread)
+        Yields whether the lock is held (see SessionStore.lock)
+        """
+        if not self.shared:
+            with super().lock(session_id, blocking) as acquired:
+                yield acquired
+            return
+        stripe = zlib.crc32(session_id.encode()) % LOCK_STRIPES
+        stripe_lock = self._stripe_locks[stripe]
+        if not stripe_lock.acquire(blocking=blocking):
+            yield False
+            return
+        try:
+            depth = self._stripe_depth[stripe]
+            if depth == 0 and not self._lock_stripe(stripe, blocking):
+                yield False
+                return
+            self._stripe_depth[stripe] = depth + 1
+            try:
+                yield True
+            finally:
+                self._stripe_depth[stripe] = depth
+                if depth == 0:
+                    fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, stripe)
+        finally:
+            stripe_lock.release()
+
+    def _lock_stripe(self, stripe, blocking):
+        """Take a stripe's file lock; False if another worker holds it and blocking is off"""
+        if blocking:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, stripe)
+            return True
+        try:
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, stripe)
+        except (BlockingIOError, PermissionError):
+            return False
+        return True
+
+    def _queue(self, session_id, value):
+        # Snapshot under the session lock: the flusher never sees a session
+        # mid-update, and later in-place changes need another mark_dirty
+        with self.lock(session_id):
+            data = self._serialize(value)
+        with self._lock:
+            self._dirty[session_id] = data
+            if len(self._dirty) >= self.flush_batch:
+                self._flush_requested.set()
+
+    def _flush_forever(self):
+        while True:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The batch was requeued; keep flushing once the database recovers
+                logger.exception("Flushing %s sessions failed", self.name)
+
+    def flush(self):
+        """Write every pending session in one transaction; returns the row count"""
+        with self._lock:
+            pending, self._dirty = self._dirty, {}
+        if not pending:
+            return 0
+        now = time.time()
+        rows = [(session_id, data, now) for session_id, data in pending.items()]
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                try:
+                    self._db.executemany(
+                        "INSERT INTO sessions (session_id, data, updated, version) VALUES (?, ?, ?, 1) "
+                        "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, "
+                        "updated = excluded.updated, version = sessions.version + 1",
+                        rows
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+        except Exception:
+            # Put the batch back unless a newer snapshot was queued meanwhile
+            with self._lock:
+                for session_id, data in pending.items():
+                    self._dirty.setdefault(session_id, data)
+            raise
+        self.flushes += 1
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def __delitem__(self, session_id):
+        if self.pop(session_id) is None:
+            raise KeyError(session_id)
+
+    def pop(self, session_id, default=None):
+        value = super().pop(session_id)
+        with self._lock:
+            dirty = self._dirty.pop(session_id, None)
+        if value is None and dirty is not None:
+            value = self._deserialize(dirty)
+        self._versions.pop(session_id, None)
+        with self._db_lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return default if value is None else value
+
+    def sweep(self):
+        """Expire idle cached sessions and delete idle rows nobody holds"""
+        removed = super().sweep()
+        with self._lock:
+            for session_id in [s for s in self._versions if s not in self._entries]:
+                del self._versions[session_id]
+        cutoff = time.time() - self.ttl
+        with self._db_lock:
+            idle = [row[0] for row in self._db.execute(
+                "SELECT session_id FROM sessions WHERE updated < ?", (cutoff,)
+            )]
+        with self._lock:
+            idle = [
+                session_id for session_id in idle
+                if session_id not in self._entries and session_id not in self._dirty
+            ]
+        if idle:
+            with self._db_lock:
+                self._db.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in idle])
+            with self._lock:
+                self.expired += len(idle)
+            self._notify(idle)
+        return removed + len(idle)
+
+    def stats(self):
+        stats = super().stats()
+        with self._db_lock:
+            stored = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        with self._lock:
+            stats.update({
+                'backend': 'sqlite',
+                'shared': self.shared,
+                'cached': stats['entries'],
+                'entries': stored,
+                'pending_writes': len(self._dirty),
+                'loads': self.loads,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written
+            })
+        return stats
+
+
+def create_session_store(name, codec=None, **kwargs):
+    """
+    Session store for a blueprint: SQLite-backed when SESSION_BACKEND=sqlite
+    and the sessions can be serialized (codec given), in memory otherwise
+    """
+    if SESSION_BACKEND == 'sqlite' and codec is not None:
+        return SQLiteSessionStore(name, SESSION_DB, codec, shared=SESSION_SHARED, **kwargs)
+    return SessionStore(name, **kwargs)
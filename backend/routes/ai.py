@@ -1,11 +1,19 @@
-from flask import Blueprint, request, jsonify
-import copy
+from flask import Blueprint, Response, request, jsonify
+import json
+from algorithms.astar_search import AStarSearch, NodeRecorder
 from algorithms.csp_solver import CSPSolver
+from algorithms.domains import count_solutions, is_solved
+from algorithms.policy_table import get_policy
+from algorithms.transposition import canonical_state, planning_table, state_weight
+from models.jobs import QueueFull, job_queue
+from routes.game import event_stream, session_locked, sse_event
 
 ai_bp = Blueprint('ai', __name__)
 
-# Store AI state per session
-ai_sessions = {}
+# Upper bound on explored nodes a single /plan request may record
+MAX_RECORDED_NODES = 10000
+# Node expansions a plan may use (the default, and the cap on node_limit)
+MAX_PLAN_NODES = 50000
 
 # Forward declaration - will be imported after game module loads
 game_sessions = None
@@ -21,8 +29,40 @@ def init_game_imports():
         get_game_state = ggs
         apply_action = aa
 
+class SessionPlanningView:
+    """
+    Exposes a game session through the case_data/current_state interface
+    AStarSearch expects, without the hidden clue outcomes: every check is
+    assumed to come back negative (its target is eliminated). Plans are
+    worst-case budgets that reveal nothing about the solution; following
+    one never costs more than planned, as a positive check only resolves
+    its variable sooner.
+    """
+    
+    def __init__(self, game_state):
+        self.index = game_state['domain_index']
+        # A snapshot: the search may run after the session lock is released
+        self.domain_masks = dict(game_state['domain_masks'])
+        self.total_cost = game_state['total_cost']
+        self.actions = [
+            {
+                'id': action['id'],
+                'action': action['action'],
+                'cost': action['cost'],
+                'constraint': (*action['target'], 'eliminate') if action['target'] else None
+            }
+            for action in game_state['available_actions']
+        ]
+    
+    def get_available_actions(self):
+        return self.actions
+
 class AIDetective:
-    """AI Detective using A* search and CSP"""
+    """
+    AI Detective using A* search and CSP
+    Built from the game session on every request (nothing is kept between
+    requests), so every worker sharing the session store sees the same AI
+    """
     
     def __init__(self, session_id):
         init_game_imports()
@@ -30,9 +70,10 @@ class AIDetective:
         game_state = get_game_state(session_id)
         if not game_state:
             raise ValueError("Invalid session_id")
-        self.domains = copy.deepcopy(game_state['current_domains'])
-        self.total_cost = 0
-        self.actions_taken = 0
+        self.index = game_state['domain_index']
+        self.masks = dict(game_state['domain_masks'])
+        self.total_cost = game_state['total_cost']
+        self.actions_taken = len(game_state['actions_taken'])
         self.algorithm_steps = []
         
     def get_best_action(self):
@@ -47,33 +88,47 @@ class AIDetective:
         if not available_actions:
             return None, "No actions available", []
         
-        evaluations = []
-        best_action = None
-        best_f_score = float('inf')
-        
-        for action in available_actions:
-            # g(n): actual cost
-            g_cost = self.total_cost + action['cost']
-            
-            # h(n): heuristic (possible solutions remaining)
-            h_cost = self._calculate_heuristic()
-            
-            # f(n) = g(n) + h(n)
-            f_cost = g_cost + h_cost
-            
-            evaluations.append({
-                'action': action['action'],
-                'action_id': action['id'],
-                'g_cost': g_cost,
+        # Precomputed optimal policy: O(1) lookup for cases small enough to solve offline
+        policy = get_policy(game_state['case'])
+        if policy:
+            result = self._policy_action(policy, game_state, available_actions)
+            if result:
+                return result
+        
+        # Live search: one-step A* lookahead with the admissible planning
+        # heuristic. The scores only depend on the canonical state, so
+        # sessions reaching the same state share them and skip the search
+        state = canonical_state(game_state['case'], game_state['domain_masks'], available_actions)
+        cache_key = ('a*-lookahead', state) if state else None
+        scores = planning_table.get(cache_key) if cache_key else None
+        
+        if scores is None:
+            view = SessionPlanningView(game_state)
+            suggestion = AStarSearch(view, view).suggest_next_action()
+            # (evidence_id, h(n)) in f order; empty when no action narrows the domains
+            scores = tuple(
+                (evaluation['evidence_id'], evaluation['h_cost'])
+                for evaluation in suggestion['all_evaluations']
+            ) if suggestion else ()
+            if cache_key:
+                planning_table.put(cache_key, scores, state_weight(state, len(scores)))
+        
+        if not scores:
+            return None, "No action narrows the domains", []
+        
+        by_id = {action['id']: action for action in available_actions}
+        evaluations = [
+            {
+                'action': by_id[evidence_id]['action'],
+                'action_id': evidence_id,
+                'g_cost': self.total_cost + by_id[evidence_id]['cost'],
                 'h_cost': h_cost,
-                'f_cost': f_cost
-            })
-            
-            if f_cost < best_f_score:
-                best_f_score = f_cost
-                best_action = action
-        
-        evaluations.sort(key=lambda x: x['f_cost'])
+                'f_cost': self.total_cost + by_id[evidence_id]['cost'] + h_cost
+            }
+            for evidence_id, h_cost in scores
+        ]
+        best_action = by_id[scores[0][0]]
+        best_f_score = evaluations[0]['f_cost']
         
         explanation = f"Selected '{best_action['action']}' using A* algorithm (F-score: {best_f_score:.1f})"
         
@@ -86,29 +141,48 @@ class AIDetective:
         
         return best_action, explanation, evaluations
     
-    def _calculate_heuristic(self):
-        """Calculate heuristic based on domain sizes"""
-        init_game_imports()
-        game_state = get_game_state(self.session_id)
-        if not game_state:
-            return 100
-            
-        domains = game_state.get('current_domains', {})
+    def _policy_action(self, policy, game_state, available_actions):
+        """Best action from the policy table; None if the state isn't covered"""
+        entry = policy.lookup(game_state['domain_masks'])
+        if not entry:
+            return None
+        best_id, expected_cost = entry
+        best_action = next((a for a in available_actions if a['id'] == best_id), None)
+        if not best_action:
+            return None
+        
+        # Q-values: g(n) is the cost so far plus the action, h(n) the expected cost after it
+        action_values = policy.action_values(self.index, game_state['domain_masks'], available_actions)
+        evaluations = [
+            {
+                'action': action['action'],
+                'action_id': action['id'],
+                'g_cost': self.total_cost + action['cost'],
+                'h_cost': action_values[action['id']] - action['cost'],
+                'f_cost': self.total_cost + action_values[action['id']]
+            }
+            for action in available_actions
+        ]
+        evaluations.sort(key=lambda x: x['f_cost'])
         
-        # Count possible solutions
-        possible = 1
-        for values in domains.values():
-            possible *= len(values)
+        explanation = f"Selected '{best_action['action']}' from the precomputed optimal policy " \
+                      f"(expected remaining cost: {expected_cost:.1f})"
         
-        # Heuristic: estimate cost to narrow down to 1 solution
-        return possible * 2
+        self.algorithm_steps.append({
+            'type': 'search',
+            'algorithm': 'Optimal Policy (DP)',
+            'message': explanation,
+            'details': f"Table lookup over {len(evaluations)} actions"
+        })
+        
+        return best_action, explanation, evaluations
     
     def update_state(self, evidence, csp_result):
         """Update AI state after taking action"""
         init_game_imports()
         game_state = get_game_state(self.session_id)
         if game_state:
-            self.domains = copy.deepcopy(game_state['current_domains'])
+            self.masks = dict(game_state['domain_masks'])
         self.total_cost += evidence['cost']
         self.actions_taken += 1
         
@@ -117,15 +191,18 @@ class AIDetective:
     
     def is_solved(self):
         """Check if case is solved"""
-        return all(len(values) == 1 for values in self.domains.values())
+        return is_solved(self.masks)
+    
+    def get_domains(self):
+        """List view of the AI's domains"""
+        return self.index.decode(self.masks)
     
     def get_solution(self):
         """Get current solution"""
         if self.is_solved():
             return {
-                'suspect': self.domains['suspect'][0],
-                'weapon': self.domains['weapon'][0],
-                'location': self.domains['location'][0]
+                var: self.index.first_value(var, mask)
+                for var, mask in self.masks.items()
             }
         return None
     
@@ -135,10 +212,12 @@ class AIDetective:
         game_state = get_game_state(self.session_id)
         if not game_state:
             return 0.0
-        possible = game_state.get('possible_solutions', 27)
-        return 1.0 - (possible / 27.0)
+        possible = game_state['possible_solutions']
+        total = count_solutions(self.index.full_masks)
+        return 1.0 - (possible / total)
 
 @ai_bp.route('/make-move', methods=['POST'])
+@session_locked
 def make_ai_move():
     """AI makes one move"""
     try:
@@ -159,17 +238,14 @@ def make_ai_move():
                 'message': 'No active game found'
             }), 404
         
-        # Initialize or get AI detective
-        if session_id not in ai_sessions:
-            try:
-                ai_sessions[session_id] = AIDetective(session_id)
-            except ValueError as e:
-                return jsonify({
-                    'success': False,
-                    'message': str(e)
-                }), 400
-        
-        ai_detective = ai_sessions[session_id]
+        # AI state comes from the (possibly shared) game session
+        try:
+            ai_detective = AIDetective(session_id)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
         # Check if already solved
         if ai_detective.is_solved():
@@ -181,7 +257,7 @@ def make_ai_move():
                     'total_cost': ai_detective.total_cost,
                     'actions_taken': ai_detective.actions_taken,
                     'possible_solutions': 1,
-                    'current_domains': ai_detective.domains,
+                    'current_domains': ai_detective.get_domains(),
                     'confidence': 1.0,
                     'algorithm': 'A* Search + CSP'
                 },
@@ -223,8 +299,8 @@ def make_ai_move():
                 'solution': ai_detective.get_solution() if ai_detective.is_solved() else None,
                 'total_cost': ai_detective.total_cost,
                 'actions_taken': ai_detective.actions_taken,
-                'possible_solutions': updated_game_state.get('possible_solutions', 27),
-                'current_domains': ai_detective.domains,
+                'possible_solutions': updated_game_state['possible_solutions'],
+                'current_domains': ai_detective.get_domains(),
                 'confidence': ai_detective.get_confidence(),
                 'algorithm': 'A* Search + CSP',
                 'next_best_action': next_action['action'] if next_action else None
@@ -247,6 +323,7 @@ def make_ai_move():
         }), 500
 
 @ai_bp.route('/auto-solve', methods=['POST'])
+@session_locked
 def auto_solve():
     """AI automatically solves the case"""
     try:
@@ -267,56 +344,20 @@ def auto_solve():
                 'message': 'No active game found'
             }), 404
         
-        # Create fresh AI detective instance
         try:
             ai_detective = AIDetective(session_id)
-            ai_sessions[session_id] = ai_detective
         except ValueError as e:
             return jsonify({
                 'success': False,
                 'message': str(e)
             }), 400
         
-        solution_path = []
-        max_iterations = 15
-        iteration = 0
-        
-        while not ai_detective.is_solved() and iteration < max_iterations:
-            iteration += 1
-            
-            best_action, explanation, _ = ai_detective.get_best_action()
-            if not best_action:
-                break
-            
-            result = apply_action(session_id, best_action['id'])
-            if not result:
-                break
-            
-            evidence, csp_result = result
-            ai_detective.update_state(evidence, csp_result)
-            
-            solution_path.append({
-                'step': iteration,
-                'action': evidence['action'],
-                'clue': evidence['clue'],
-                'cost': evidence['cost'],
-                'reasoning': explanation,
-                'type': 'search',
-                'algorithm': 'A* + CSP',
-                'message': f"Step {iteration}: {evidence['action']}",
-                'details': explanation
-            })
-        
-        final_game_state = get_game_state(session_id)
+        solution_path = list(iter_auto_solve(session_id, ai_detective))
         
         return jsonify({
             'success': True,
-            'solved': ai_detective.is_solved(),
-            'solution': ai_detective.get_solution(),
-            'steps_taken': ai_detective.actions_taken,
-            'total_cost': ai_detective.total_cost,
-            'solution_path': solution_path,
-            'final_domains': final_game_state.get('current_domains', {})
+            **auto_solve_summary(ai_detective),
+            'solution_path': solution_path
         })
     except Exception as e:
         import traceback
@@ -327,7 +368,95 @@ def auto_solve():
             'message': f'Error: {str(e)}'
         }), 500
 
+@ai_bp.route('/auto-solve/stream', methods=['GET', 'POST'])
+def auto_solve_stream():
+    """
+    Auto-solve as server-sent events: one 'step' event per action as soon
+    as it is chosen and applied, then a 'done' event with the summary
+    session_id comes from the JSON body or the query string (EventSource)
+    """
+    try:
+        init_game_imports()
+        data = request.get_json(silent=True) or request.args
+        session_id = data.get('session_id')
+        
+        if not session_id:
+            return jsonify({
+                'success': False,
+                'message': 'Missing session_id'
+            }), 400
+        
+        if not get_game_state(session_id):
+            return jsonify({
+                'success': False,
+                'message': 'No active game found'
+            }), 404
+        
+        def generate():
+            # The session is locked per step, never across a yield: the
+            # server may pull successive chunks on different threads
+            try:
+                with game_sessions.lock(session_id):
+                    ai_detective = AIDetective(session_id)
+                for step in iter_auto_solve(session_id, ai_detective):
+                    yield sse_event('step', step)
+                yield sse_event('done', {'success': True, **auto_solve_summary(ai_detective)})
+            except Exception as e:
+                yield sse_event('error', {'success': False, 'message': f'Error: {str(e)}'})
+        
+        return event_stream(generate())
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+def iter_auto_solve(session_id, ai_detective, max_iterations=15):
+    """
+    Take AI actions until solved, yielding each step as soon as it is applied
+    Each step (choose, apply, update) holds the session lock; it is released
+    before yielding, so consumers may resume the generator on any thread
+    """
+    iteration = 0
+    while not ai_detective.is_solved() and iteration < max_iterations:
+        iteration += 1
+        
+        with game_sessions.lock(session_id):
+            best_action, explanation, _ = ai_detective.get_best_action()
+            if not best_action:
+                break
+            
+            result = apply_action(session_id, best_action['id'])
+            if not result:
+                break
+            
+            evidence, csp_result = result
+            ai_detective.update_state(evidence, csp_result)
+        
+        yield {
+            'step': iteration,
+            'action': evidence['action'],
+            'clue': evidence['clue'],
+            'cost': evidence['cost'],
+            'reasoning': explanation,
+            'type': 'search',
+            'algorithm': 'A* + CSP',
+            'message': f"Step {iteration}: {evidence['action']}",
+            'details': explanation
+        }
+
+def auto_solve_summary(ai_detective):
+    """Outcome of an auto-solve run"""
+    return {
+        'solved': ai_detective.is_solved(),
+        'solution': ai_detective.get_solution(),
+        'steps_taken': ai_detective.actions_taken,
+        'total_cost': ai_detective.total_cost,
+        'final_domains': ai_detective.get_domains()
+    }
+
 @ai_bp.route('/suggest', methods=['POST'])
+@session_locked
 def get_suggestion():
     """Get AI suggestion for next action"""
     try:
@@ -381,3 +510,288 @@ def get_suggestion():
             'success': False,
             'message': f'Error: {str(e)}'
         }), 500
+
+@ai_bp.route('/plan', methods=['POST'])
+def plan_investigation():
+    """
+    Find the cheapest worst-case investigation path with A* or
+    memory-bounded IDA* (see SessionPlanningView)
+    Explored nodes are only recorded when record_nodes is given; they can
+    be paged with explored_offset/explored_limit or streamed as NDJSON
+    """
+    try:
+        init_game_imports()
+        data = request.json
+        session_id = data.get('session_id')
+        mode = data.get('mode', 'astar')
+        node_limit = data.get('node_limit')
+        memory_limit = data.get('memory_limit')
+        record_nodes = data.get('record_nodes')
+        record_strategy = data.get('record_strategy', 'ring')
+        explored_offset = data.get('explored_offset', 0)
+        explored_limit = data.get('explored_limit')
+        
+        if not session_id:
+            return jsonify({
+                'success': False,
+                'message': 'Missing session_id'
+            }), 400
+        
+        if mode not in ('astar', 'ida'):
+            return jsonify({
+                'success': False,
+                'message': "mode must be 'astar' or 'ida'"
+            }), 400
+        
+        if record_strategy not in NodeRecorder.STRATEGIES:
+            return jsonify({
+                'success': False,
+                'message': "record_strategy must be 'ring' or 'sample'"
+            }), 400
+        
+        limits = (
+            ('node_limit', node_limit),
+            ('memory_limit', memory_limit),
+            ('record_nodes', record_nodes),
+            ('explored_limit', explored_limit)
+        )
+        for name, limit in limits:
+            if limit is not None and (not isinstance(limit, int) or limit < 1):
+                return jsonify({
+                    'success': False,
+                    'message': f'{name} must be a positive integer'
+                }), 400
+        
+        if not isinstance(explored_offset, int) or explored_offset < 0:
+            return jsonify({
+                'success': False,
+                'message': 'explored_offset must be a non-negative integer'
+            }), 400
+        node_limit = min(node_limit or MAX_PLAN_NODES, MAX_PLAN_NODES)
+        
+        # Snapshot under the session lock; the search itself runs unlocked
+        # so actions on the session don't wait for it
+        with game_sessions.lock(session_id):
+            game_state = get_game_state(session_id)
+            view = SessionPlanningView(game_state) if game_state else None
+        if view is None:
+            return jsonify({
+                'success': False,
+                'message': 'No active game found'
+            }), 404
+        
+        recorder = None
+        if record_nodes:
+            recorder = NodeRecorder(min(record_nodes, MAX_RECORDED_NODES), record_strategy)
+        
+        result = AStarSearch(view, view, recorder).search(mode, node_limit, memory_limit)
+        
+        if not result['success']:
+            return jsonify(result)
+        
+        explored = result['explored_nodes']
+        end = None if explored_limit is None else explored_offset + explored_limit
+        page = explored[explored_offset:end]
+        
+        summary = _plan_summary(result)
+        summary['explored_nodes_recorded'] = len(explored)
+        summary['explored_offset'] = explored_offset
+        
+        if data.get('stream'):
+            # One JSON document per line: the summary, then each node
+            def generate():
+                yield json.dumps(summary) + '\n'
+                for node in page:
+                    yield json.dumps(node) + '\n'
+            return Response(generate(), mimetype='application/x-ndjson')
+        
+        summary['explored_nodes'] = page
+        return jsonify(summary)
+    except Exception as e:
+        import traceback
+        print(f"Error in plan_investigation: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+@ai_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Run auto-solve or a full plan in the background
+    Body: {session_id, kind: 'auto-solve' | 'plan', mode, node_limit, memory_limit}
+    Returns a job id at once (202); 429 when too many jobs are pending
+    """
+    try:
+        init_game_imports()
+        data = request.json
+        session_id = data.get('session_id')
+        kind = data.get('kind', 'auto-solve')
+        mode = data.get('mode', 'astar')
+        node_limit = data.get('node_limit')
+        memory_limit = data.get('memory_limit')
+        
+        if not session_id:
+            return jsonify({
+                'success': False,
+                'message': 'Missing session_id'
+            }), 400
+        
+        if kind not in JOB_KINDS:
+            return jsonify({
+                'success': False,
+                'message': "kind must be 'auto-solve' or 'plan'"
+            }), 400
+        
+        if mode not in ('astar', 'ida'):
+            return jsonify({
+                'success': False,
+                'message': "mode must be 'astar' or 'ida'"
+            }), 400
+        
+        for name, limit in (('node_limit', node_limit), ('memory_limit', memory_limit)):
+            if limit is not None and (not isinstance(limit, int) or limit < 1):
+                return jsonify({
+                    'success': False,
+                    'message': f'{name} must be a positive integer'
+                }), 400
+        node_limit = min(node_limit or MAX_PLAN_NODES, MAX_PLAN_NODES)
+        
+        if not get_game_state(session_id):
+            return jsonify({
+                'success': False,
+                'message': 'No active game found'
+            }), 404
+        
+        if kind == 'auto-solve':
+            run = lambda job: run_auto_solve_job(job, session_id)
+        else:
+            run = lambda job: run_plan_job(job, session_id, mode, node_limit, memory_limit)
+        
+        try:
+            job = job_queue.submit(kind, session_id, run)
+        except QueueFull as e:
+            response = jsonify({
+                'success': False,
+                'message': f'Too many background jobs, retry later ({str(e)})'
+            })
+            response.headers['Retry-After'] = '1'
+            return response, 429
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict()
+        }), 202
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and progress of a job, with its result once finished"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(include_result=True)
+    })
+
+@ai_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or stop a running one at its next step"""
+    job = job_queue.cancel(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+@ai_bp.route('/jobs', methods=['GET'])
+def job_stats():
+    """Queue depth and job counts (backpressure monitoring)"""
+    return jsonify({
+        'success': True,
+        'jobs': job_queue.stats()
+    })
+
+JOB_KINDS = ('auto-solve', 'plan')
+
+def run_auto_solve_job(job, session_id):
+    """
+    Auto-solve in the background, reporting progress after every step
+    The session is locked one step at a time (see iter_auto_solve), so
+    requests on it are interleaved with the job instead of waiting it out
+    """
+    with game_sessions.lock(session_id):
+        ai_detective = AIDetective(session_id)
+    solution_path = []
+    for step in iter_auto_solve(session_id, ai_detective):
+        solution_path.append(step)
+        job.progress = {
+            'steps': len(solution_path),
+            'total_cost': ai_detective.total_cost,
+            'last_action': step['action']
+        }
+        if job.cancelled:
+            break
+    return {
+        'success': True,
+        **auto_solve_summary(ai_detective),
+        'solution_path': solution_path
+    }
+
+def run_plan_job(job, session_id, mode, node_limit, memory_limit):
+    """Full A*/IDA* plan in the background, on a snapshot of the session"""
+    with game_sessions.lock(session_id):
+        game_state = get_game_state(session_id)
+        if not game_state:
+            raise ValueError('No active game found')
+        view = SessionPlanningView(game_state)
+    job.progress = {'phase': 'searching'}
+    result = AStarSearch(view, view).search(mode, node_limit, memory_limit)
+    if not result['success']:
+        return result
+    return _plan_summary(result)
+
+@ai_bp.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the shared planning transposition table"""
+    return jsonify({
+        'success': True,
+        'transposition_table': planning_table.stats()
+    })
+
+def _plan_summary(result):
+    """Public part of a successful search result"""
+    return {
+        'success': True,
+        'mode': result['mode'],
+        'next_action': _public_action(result['next_action']),
+        'optimal_path': [_public_action(action) for action in result['optimal_path']],
+        'total_cost': result['total_cost'],
+        'nodes_explored': result['nodes_explored'],
+        'path_length': result['path_length']
+    }
+
+def _public_action(action):
+    """Action fields safe to show before the evidence is taken"""
+    if action is None:
+        return None
+    return {
+        'id': action['id'],
+        'action': action['action'],
+        'cost': action['cost']
+    }
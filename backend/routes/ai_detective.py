@@ -1,74 +1,69 @@
 from flask import Blueprint, request, jsonify
 import heapq
 from typing import Dict, List, Tuple
-import copy
+from algorithms.csp_solver import CSPSolver
+from algorithms.domains import count_solutions, count_values, is_solved
+from algorithms.hypothesis import information_gains
+from algorithms.transposition import canonical_state, planning_table, state_weight
+from routes.game import event_stream, game_sessions, session_locked, sse_event
 
 ai_detective_bp = Blueprint('ai_detective', __name__)
 
-# Store AI state per session
-ai_sessions = {}
-
 class AIDetective:
-    """AI Detective using A* search and CSP with enhanced heuristics"""
+    """
+    AI Detective using A* search and CSP with enhanced heuristics
+    Built from the game session on every request, so workers sharing the
+    session store never disagree about the AI's progress
+    """
     
     def __init__(self, game_state, available_actions, solution):
-        self.domains = copy.deepcopy(game_state['current_domains'])
-        self.available_actions = copy.deepcopy(available_actions)
+        self.case = game_state['case']
+        self.index = game_state['domain_index']
+        # The AI's own view of the domains, narrowed by the clues it collects
+        self.solver = CSPSolver(dict(game_state['domain_masks']), [], index=self.index)
+        self.masks = self.solver.masks
+        self.available_actions = list(available_actions)
         self.solution = solution
-        self.total_cost = 0
-        self.actions_taken = []
+        self.total_cost = game_state['total_cost']
+        self.actions_taken = list(game_state['actions_taken'])
         self.possible_solutions = self._count_solutions()
         self.algorithm_steps = []
         
     def _count_solutions(self):
         """Count possible solutions from current domains"""
-        count = 1
-        for values in self.domains.values():
-            count *= len(values)
-        return count
+        return count_solutions(self.masks)
     
-    def _heuristic(self, domains):
+    def _heuristic(self, masks):
         """
         Enhanced heuristic for A* search
         Estimates cost to reach solution from current state
         """
+        sizes = [count_values(mask) for mask in masks.values()]
+        
         # H1: Remaining uncertainty (number of possible solutions)
         solutions_left = 1
-        for values in domains.values():
-            solutions_left *= len(values)
+        for size in sizes:
+            solutions_left *= size
         
         # H2: Average domain size (prefer smaller domains)
-        avg_domain_size = sum(len(v) for v in domains.values()) / len(domains)
+        avg_domain_size = sum(sizes) / len(sizes)
         
         # H3: Unresolved categories (categories with multiple possibilities)
-        unresolved = sum(1 for v in domains.values() if len(v) > 1)
+        unresolved = sum(1 for size in sizes if size > 1)
         
         # Combined heuristic (weighted)
         h = (solutions_left * 2) + (avg_domain_size * 5) + (unresolved * 10)
         return h
     
-    def _information_gain(self, action, current_domains):
+    def _information_gains(self):
         """
-        Calculate expected information gain from an action
-        Uses entropy-based approach
+        Expected information gain (entropy reduction in bits) of every
+        available action, scored in one batch from the domain marginals
+        (clues constrain one variable each, so these counts are exact)
+        Returns {evidence_id: info_gain}
         """
-        import math
-        
-        # Calculate current entropy
-        current_entropy = 0
-        for values in current_domains.values():
-            if len(values) > 0:
-                p = 1.0 / len(values)
-                current_entropy -= len(values) * p * math.log2(p) if p > 0 else 0
-        
-        # Estimate expected entropy after action
-        # (simplified - assumes action will eliminate some possibilities)
-        expected_reduction = len(action.get('eliminates', [])) * 0.5
-        
-        # Information gain = current entropy - expected entropy after action
-        info_gain = expected_reduction / (action['cost'] + 1)  # Normalize by cost
-        
-        return info_gain
+        gains = information_gains(self.index, self.masks, self.available_actions)
+        return {action['id']: gain for action, gain in zip(self.available_actions, gains)}
     
     def get_best_action(self):
         """
@@ -78,22 +73,31 @@ class AIDetective:
         if not self.available_actions:
             return None, "No actions available", []
         
+        # Per-action (h, information gain) only depend on the canonical state,
+        # so they are shared across sessions through the transposition table
+        state = canonical_state(self.case, self.masks, self.available_actions)
+        cache_key = ('info-gain', state) if state else None
+        scores = planning_table.get(cache_key) if cache_key else None
+        
+        if scores is None:
+            # h(n): heuristic estimate to goal, plus information gain bonus
+            h_cost = self._heuristic(self.masks)
+            scores = {
+                action_id: (h_cost, info_gain)
+                for action_id, info_gain in self._information_gains().items()
+            }
+            if cache_key:
+                planning_table.put(cache_key, scores, state_weight(state, len(scores)))
+        
         evaluations = []
         best_action = None
         best_f_score = float('inf')
         
         for action in self.available_actions:
-            # Simulate taking this action
-            simulated_domains = copy.deepcopy(self.domains)
-            
             # g(n): actual cost so far + action cost
             g_cost = self.total_cost + action['cost']
             
-            # h(n): heuristic estimate to goal
-            h_cost = self._heuristic(simulated_domains)
-            
-            # Information gain bonus
-            info_gain = self._information_gain(action, self.domains)
+            h_cost, info_gain = scores[action['id']]
             
             # f(n) = g(n) + h(n) - information_gain_bonus
             f_cost = g_cost + h_cost - (info_gain * 20)
@@ -116,7 +120,7 @@ class AIDetective:
         
         explanation = f"Selected '{best_action['action']}' using A* algorithm. " \
                      f"F-score: {best_f_score:.2f} (Cost: {best_action['cost']}, " \
-                     f"Heuristic: {self._heuristic(self.domains):.2f})"
+                     f"Heuristic: {self._heuristic(self.masks):.2f})"
         
         self.algorithm_steps.append({
             'type': 'search',
@@ -129,82 +133,45 @@ class AIDetective:
     
     def apply_csp_constraints(self, evidence):
         """
-        Apply CSP constraints based on evidence
-        Uses arc consistency and forward checking
+        Apply the evidence's structured constraint (resolved when the case
+        was built) and propagate it with arc consistency
         """
         steps = []
-        
-        # Parse the clue
-        clue = evidence['clue'].lower()
-        
-        # Extract constraint information
-        if 'not' in clue or 'wasn\'t' in clue or 'didn\'t' in clue:
-            # Elimination constraint
-            for category in self.domains:
-                for value in list(self.domains[category]):
-                    if value.lower() in clue:
-                        if len(self.domains[category]) > 1:
-                            self.domains[category].remove(value)
-                            steps.append({
-                                'type': 'elimination',
-                                'algorithm': 'CSP - Arc Consistency',
-                                'message': f"Eliminated {value} from {category}",
-                                'details': f"Clue indicated: {clue}"
-                            })
-        else:
-            # Confirmation or implication constraint
-            for category in self.domains:
-                for value in list(self.domains[category]):
-                    if value.lower() in clue:
-                        if len(self.domains[category]) > 1:
-                            self.domains[category] = [value]
-                            steps.append({
-                                'type': 'confirmation',
-                                'algorithm': 'CSP - Domain Reduction',
-                                'message': f"Confirmed {value} as {category}",
-                                'details': f"Clue indicated: {clue}"
-                            })
-        
-        # Forward checking - check if this creates new constraints
-        self._forward_check(steps)
+        constraint = evidence.get('constraint')
+        if constraint:
+            self.solver.propagate([constraint])
+            steps = [
+                {
+                    'type': step['type'],
+                    'algorithm': 'CSP - Domain Reduction' if step['step'] == 'Confirmation' else 'CSP - Arc Consistency',
+                    'message': step['message'],
+                    'details': f"Clue indicated: {evidence['clue']}"
+                }
+                for step in self.solver.get_steps()
+            ]
         
         self.possible_solutions = self._count_solutions()
         return steps
     
-    def _forward_check(self, steps):
-        """
-        Forward checking to propagate constraints
-        """
-        # Check if any domain is solved (has one value)
-        for category, values in self.domains.items():
-            if len(values) == 1:
-                solved_value = values[0]
-                # Remove this value from other categories if applicable
-                for other_cat, other_vals in self.domains.items():
-                    if other_cat != category and solved_value in other_vals and len(other_vals) > 1:
-                        other_vals.remove(solved_value)
-                        steps.append({
-                            'type': 'elimination',
-                            'algorithm': 'CSP - Forward Checking',
-                            'message': f"Eliminated {solved_value} from {other_cat} (already assigned to {category})",
-                            'details': 'Constraint propagation'
-                        })
-    
     def is_solved(self):
         """Check if the case is solved"""
-        return all(len(values) == 1 for values in self.domains.values())
+        return is_solved(self.masks)
+    
+    def get_domains(self):
+        """List view of the AI's domains"""
+        return self.index.decode(self.masks)
     
     def get_solution(self):
         """Get the current solution"""
         if self.is_solved():
             return {
-                'suspect': self.domains['suspect'][0],
-                'weapon': self.domains['weapon'][0],
-                'location': self.domains['location'][0]
+                category: self.index.first_value(category, mask)
+                for category, mask in self.masks.items()
             }
         return None
 
 @ai_detective_bp.route('/make-move', methods=['POST'])
+@session_locked
 def make_ai_move():
     """AI makes one move in the investigation"""
     try:
@@ -221,15 +188,12 @@ def make_ai_move():
                 'message': 'No active game found'
             })
         
-        # Initialize or get AI detective for this session
-        if session_id not in ai_sessions:
-            ai_sessions[session_id] = AIDetective(
-                game_state,
-                game_state.get('available_actions', []),
-                game_state.get('solution')
-            )
-        
-        ai_detective = ai_sessions[session_id]
+        # AI state comes from the (possibly shared) game session
+        ai_detective = AIDetective(
+            game_state,
+            game_state.get('available_actions', []),
+            game_state.get('solution')
+        )
         
         # Check if already solved
         if ai_detective.is_solved():
@@ -241,7 +205,7 @@ def make_ai_move():
                     'total_cost': ai_detective.total_cost,
                     'actions_taken': len(ai_detective.actions_taken),
                     'possible_solutions': 1,
-                    'current_domains': ai_detective.domains,
+                    'current_domains': ai_detective.get_domains(),
                     'confidence': 1.0,
                     'algorithm': 'A* Search + CSP'
                 },
@@ -259,9 +223,11 @@ def make_ai_move():
             })
         
         # Apply the action (simulate taking it)
-        evidence = apply_action(session_id, best_action['id'])
+        result = apply_action(session_id, best_action['id'])
         
-        if evidence:
+        if result:
+            evidence, _ = result
+            
             # Update AI state
             ai_detective.total_cost += best_action['cost']
             ai_detective.actions_taken.append(evidence)
@@ -275,7 +241,8 @@ def make_ai_move():
             ai_detective.available_actions = updated_game_state.get('available_actions', [])
             
             # Calculate confidence
-            confidence = 1.0 - (ai_detective.possible_solutions / 27.0)
+            total = count_solutions(ai_detective.index.full_masks)
+            confidence = 1.0 - (ai_detective.possible_solutions / total)
             
             # Get next best action for display
             next_action, _, _ = ai_detective.get_best_action()
@@ -288,7 +255,7 @@ def make_ai_move():
                     'total_cost': ai_detective.total_cost,
                     'actions_taken': len(ai_detective.actions_taken),
                     'possible_solutions': ai_detective.possible_solutions,
-                    'current_domains': ai_detective.domains,
+                    'current_domains': ai_detective.get_domains(),
                     'confidence': confidence,
                     'algorithm': 'A* Search + CSP',
                     'next_best_action': next_action['action'] if next_action else None
@@ -314,6 +281,7 @@ def make_ai_move():
         })
 
 @ai_detective_bp.route('/auto-solve', methods=['POST'])
+@session_locked
 def auto_solve():
     """AI automatically solves the entire case"""
     try:
@@ -336,13 +304,76 @@ def auto_solve():
             game_state.get('solution')
         )
         
-        solution_path = []
-        max_iterations = 20  # Safety limit
-        iteration = 0
+        solution_path = list(iter_auto_solve(session_id, ai_detective))
         
-        while not ai_detective.is_solved() and iteration < max_iterations:
-            iteration += 1
-            
+        return jsonify({
+            'success': True,
+            **auto_solve_summary(ai_detective),
+            'solution_path': solution_path
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        })
+
+@ai_detective_bp.route('/auto-solve/stream', methods=['GET', 'POST'])
+def auto_solve_stream():
+    """
+    Auto-solve as server-sent events: one 'step' event per action as soon
+    as it is applied, then a 'done' event with the summary
+    """
+    try:
+        data = request.get_json(silent=True) or request.args
+        session_id = data.get('session_id')
+        
+        from routes.game import get_game_state
+        
+        if not session_id or not get_game_state(session_id):
+            return jsonify({
+                'success': False,
+                'message': 'No active game found'
+            })
+        
+        def generate():
+            # The session is locked per step, never across a yield: the
+            # server may pull successive chunks on different threads
+            try:
+                with game_sessions.lock(session_id):
+                    game_state = get_game_state(session_id)
+                    ai_detective = AIDetective(
+                        game_state,
+                        game_state.get('available_actions', []),
+                        game_state.get('solution')
+                    )
+                for step in iter_auto_solve(session_id, ai_detective):
+                    yield sse_event('step', step)
+                yield sse_event('done', {'success': True, **auto_solve_summary(ai_detective)})
+            except Exception as e:
+                yield sse_event('error', {'success': False, 'message': f'Error: {str(e)}'})
+        
+        return event_stream(generate())
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        })
+
+def iter_auto_solve(session_id, ai_detective, max_iterations=20):
+    """
+    Take AI actions until solved, yielding each step as soon as it is applied
+    Each step holds the session lock only until it is applied, never across
+    a yield, so consumers may resume the generator on any thread
+    """
+    from routes.game import get_game_state, apply_action
+    
+    iteration = 0
+    while not ai_detective.is_solved() and iteration < max_iterations:
+        iteration += 1
+        
+        with game_sessions.lock(session_id):
             # Get best action
             best_action, explanation, _ = ai_detective.get_best_action()
             
@@ -350,62 +381,45 @@ def auto_solve():
                 break
             
             # Apply action
-            evidence = apply_action(session_id, best_action['id'])
+            result = apply_action(session_id, best_action['id'])
             
-            if evidence:
+            if result:
+                evidence, _ = result
                 ai_detective.total_cost += best_action['cost']
                 ai_detective.actions_taken.append(evidence)
                 
                 # Apply CSP
                 csp_steps = ai_detective.apply_csp_constraints(evidence)
                 
-                solution_path.append({
-                    'step': iteration,
-                    'action': evidence['action'],
-                    'clue': evidence['clue'],
-                    'cost': evidence['cost'],
-                    'reasoning': explanation,
-                    'domains_after': copy.deepcopy(ai_detective.domains),
-                    'csp_steps': csp_steps
-                })
-                
                 # Update available actions
                 updated_game_state = get_game_state(session_id)
                 ai_detective.available_actions = updated_game_state.get('available_actions', [])
         
-        return jsonify({
-            'success': True,
-            'solved': ai_detective.is_solved(),
-            'solution': ai_detective.get_solution(),
-            'steps_taken': len(ai_detective.actions_taken),
-            'total_cost': ai_detective.total_cost,
-            'solution_path': solution_path,
-            'final_domains': ai_detective.domains
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Error: {str(e)}'
-        })
+        if result:
+            yield {
+                'step': iteration,
+                'action': evidence['action'],
+                'clue': evidence['clue'],
+                'cost': evidence['cost'],
+                'reasoning': explanation,
+                'domains_after': ai_detective.get_domains(),
+                'csp_steps': csp_steps
+            }
+
+def auto_solve_summary(ai_detective):
+    """Outcome of an auto-solve run"""
+    return {
+        'solved': ai_detective.is_solved(),
+        'solution': ai_detective.get_solution(),
+        'steps_taken': len(ai_detective.actions_taken),
+        'total_cost': ai_detective.total_cost,
+        'final_domains': ai_detective.get_domains()
+    }
 
 @ai_detective_bp.route('/reset', methods=['POST'])
 def reset_ai():
-    """Reset AI detective state"""
-    try:
-        data = request.json
-        session_id = data.get('session_id')
-        
-        if session_id in ai_sessions:
-            del ai_sessions[session_id]
-        
-        return jsonify({
-            'success': True,
-            'message': 'AI detective reset'
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Error: {str(e)}'
-        })
+    """Reset AI detective state (kept for clients: the AI holds none between requests)"""
+    return jsonify({
+        'success': True,
+        'message': 'AI detective reset'
+    })
@@ -1,135 +1,249 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+import json
 import random
+from collections import Counter, deque
+from functools import wraps
 from algorithms.csp_solver import CSPSolver
+from algorithms.domains import count_solutions
+from algorithms.hypothesis import HypothesisSpace
+from models.case_generator import (
+    SUSPECTS, WEAPONS, LOCATIONS, EVIDENCE_LIST, MAX_EVIDENCE,
+    case_from_spec, case_spec, generate_case, pick_solution, standard_case
+)
+from models.clue_rules import describe_constraint, resolve_clue
+from models.session_store import SessionConflict, all_stats, create_session_store
 
 game_bp = Blueprint('game', __name__)
 
-# Global game sessions storage
-game_sessions = {}
+# Versions kept in each session's change log for delta responses
+CHANGE_LOG_SIZE = 64
 
-# Game data
-SUSPECTS = ["Butler", "Chef", "Gardener"]
-WEAPONS = ["Knife", "Poison", "Rope"]
-LOCATIONS = ["Kitchen", "Library", "Garden"]
+def encode_game_state(game_state):
+    """
+    Compact persisted form of a session: everything else (clues, solver,
+    hypothesis tensor) is rebuilt from the case and the solution
+    """
+    return {
+        'case': case_spec(game_state['case']),
+        'solution': game_state['solution'],
+        'domain_masks': dict(game_state['domain_masks']),
+        'available_actions': [action['id'] for action in game_state['available_actions']],
+        'actions_taken': [action['id'] for action in game_state['actions_taken']],
+        'total_cost': game_state['total_cost'],
+        'constraints_count': game_state['constraints_count'],
+        'possible_solutions': game_state['possible_solutions'],
+        'version': game_state['version'],
+        'changes': list(game_state['changes'])
+    }
+
+def decode_game_state(data):
+    """Rebuild a session from encode_game_state()"""
+    game_state = build_game_state(case_from_spec(data['case']), data['solution'], data['domain_masks'])
+    actions = {action['id']: action for action in game_state['available_actions']}
+    game_state.update({
+        'available_actions': [actions[evidence_id] for evidence_id in data['available_actions']],
+        'actions_taken': [actions[evidence_id] for evidence_id in data['actions_taken']],
+        'total_cost': data['total_cost'],
+        'constraints_count': data['constraints_count'],
+        'possible_solutions': data['possible_solutions'],
+        'version': data['version'],
+        'changes': deque(data['changes'], maxlen=CHANGE_LOG_SIZE)
+    })
+    return game_state
 
-EVIDENCE_LIST = [
-    {"id": 1, "action": "Question the Butler", "cost": 5},
-    {"id": 2, "action": "Search the Kitchen", "cost": 8},
-    {"id": 3, "action": "Examine the Knife", "cost": 6},
-    {"id": 4, "action": "Question the Chef", "cost": 5},
-    {"id": 5, "action": "Search the Library", "cost": 8},
-    {"id": 6, "action": "Examine the Poison", "cost": 6},
-    {"id": 7, "action": "Question the Gardener", "cost": 5},
-    {"id": 8, "action": "Search the Garden", "cost": 8},
-    {"id": 9, "action": "Examine the Rope", "cost": 6},
-    {"id": 10, "action": "Check alibis", "cost": 10},
-    {"id": 11, "action": "Review security footage", "cost": 12},
-    {"id": 12, "action": "Analyze fingerprints", "cost": 10},
-]
+# Global game sessions storage (bounded, idle sessions expire; persisted
+# to SQLite when SESSION_BACKEND=sqlite)
+game_sessions = create_session_store('game', codec=(encode_game_state, decode_game_state))
+
+def generate_clues(solution, case=None):
+    """Generate clue text and structured constraint for every evidence item"""
+    case = case or standard_case()
+    return {
+        evidence["id"]: resolve_clue(case["rules"][evidence["id"]], solution)
+        for evidence in case["evidence"]
+    }
 
-def generate_clues(solution):
-    """Generate clues based on solution"""
-    clues = {}
+def initialize_game(session_id, case=None, seed=None):
+    """
+    Initialize a new game session
+    case: case definition (defaults to the standard case)
+    seed: makes the hidden solution reproducible
+    """
+    case = case or standard_case()
+    rng = random.Random(seed) if seed is not None else random
+    game_state = build_game_state(case, pick_solution(case, rng))
     
-    for evidence in EVIDENCE_LIST:
-        action = evidence["action"].lower()
-        clue_text = ""
-        
-        if "butler" in action:
-            if solution["suspect"] == "Butler":
-                clue_text = "The Butler seems nervous and avoids eye contact."
-            else:
-                clue_text = "The Butler has a solid alibi."
-        elif "chef" in action:
-            if solution["suspect"] == "Chef":
-                clue_text = "The Chef was seen near the crime scene."
-            else:
-                clue_text = "The Chef was in the kitchen all evening."
-        elif "gardener" in action:
-            if solution["suspect"] == "Gardener":
-                clue_text = "The Gardener's tools are missing."
-            else:
-                clue_text = "The Gardener was working outside."
-        elif "kitchen" in action:
-            if solution["location"] == "Kitchen":
-                clue_text = "Signs of struggle found in the Kitchen."
-            else:
-                clue_text = "The Kitchen appears undisturbed."
-        elif "library" in action:
-            if solution["location"] == "Library":
-                clue_text = "Books are scattered in the Library."
-            else:
-                clue_text = "The Library is pristine."
-        elif "garden" in action:
-            if solution["location"] == "Garden":
-                clue_text = "Footprints found in the Garden."
-            else:
-                clue_text = "The Garden shows no signs of disturbance."
-        elif "knife" in action:
-            if solution["weapon"] == "Knife":
-                clue_text = "The Knife has traces of blood."
-            else:
-                clue_text = "The Knife is clean."
-        elif "poison" in action:
-            if solution["weapon"] == "Poison":
-                clue_text = "Poison bottle found partially empty."
-            else:
-                clue_text = "Poison bottle is sealed and full."
-        elif "rope" in action:
-            if solution["weapon"] == "Rope":
-                clue_text = "Rope shows signs of recent use."
-            else:
-                clue_text = "The Rope is neatly coiled and unused."
-        elif "alibi" in action:
-            clue_text = f"One suspect's alibi doesn't check out."
-        elif "footage" in action:
-            clue_text = f"Camera shows someone near the {solution['location']}."
-        elif "fingerprint" in action:
-            clue_text = f"Fingerprints match someone who frequents the {solution['location']}."
-        else:
-            clue_text = "Investigation reveals some useful information."
-        
-        clues[evidence["id"]] = clue_text
+    # A new game on a reused session id keeps the version increasing, so a
+    # since_version from the old game never matches the new one
+    previous = game_sessions.get(session_id)
+    if previous is not None:
+        game_state['version'] = previous['version'] + 1
     
-    return clues
+    game_sessions[session_id] = game_state
+    return game_state
 
-def initialize_game(session_id):
-    """Initialize a new game session"""
-    solution = {
-        "suspect": random.choice(SUSPECTS),
-        "weapon": random.choice(WEAPONS),
-        "location": random.choice(LOCATIONS)
-    }
+def build_game_state(case, solution, domain_masks=None):
+    """Fresh session state for a case and hidden solution"""
+    clues = generate_clues(solution, case)
+    index = case["index"]
+    
+    # Persistent propagation engine; its masks are the session's domains
+    solver = CSPSolver(domain_masks or index.full(), [], index=index)
     
-    clues = generate_clues(solution)
+    # Joint solution space (None unless enabled, or without NumPy, or for large cases)
+    hypotheses = HypothesisSpace.for_case(case)
+    if hypotheses is not None and domain_masks:
+        hypotheses.apply_masks(domain_masks)
     
-    game_state = {
+    return {
+        "case": case,
         "solution": solution,
-        "current_domains": {
-            "suspect": SUSPECTS.copy(),
-            "weapon": WEAPONS.copy(),
-            "location": LOCATIONS.copy()
-        },
+        "domain_index": index,
+        "domain_masks": solver.masks,
+        "csp_solver": solver,
+        "hypotheses": hypotheses,
         "available_actions": [
-            {**evidence, "clue": clues[evidence["id"]]} 
-            for evidence in EVIDENCE_LIST
+            {
+                **evidence,
+                "clue": clues[evidence["id"]][0],
+                "constraint": clues[evidence["id"]][1],
+                "target": case["rules"][evidence["id"]]["target"]
+            }
+            for evidence in case["evidence"]
         ],
         "actions_taken": [],
         "total_cost": 0,
-        "constraints": [],
         "constraints_count": 0,
-        "possible_solutions": 27
+        "possible_solutions": case["total_solutions"],
+        # Bumped by every change; the log lets clients fetch deltas
+        "version": 1,
+        "changes": deque(maxlen=CHANGE_LOG_SIZE)
     }
-    
-    game_sessions[session_id] = game_state
-    return game_state
 
 def get_game_state(session_id):
     """Get current game state"""
     return game_sessions.get(session_id)
 
+def get_current_domains(game_state):
+    """List view of the session's domains for JSON responses"""
+    return game_state['domain_index'].decode(game_state['domain_masks'])
+
+def serialize_game_state(game_state):
+    """Public part of the game state returned by the game endpoints"""
+    return {
+        'current_domains': get_current_domains(game_state),
+        'total_cost': game_state['total_cost'],
+        'actions_taken': game_state['actions_taken'],
+        'possible_solutions': game_state['possible_solutions'],
+        'constraints_count': game_state['constraints_count']
+    }
+
+def record_change(game_state, evidence_list, before_masks):
+    """Bump the session version and log what the change touched"""
+    game_state['version'] += 1
+    changed = [
+        var for var, mask in game_state['domain_masks'].items()
+        if before_masks[var] != mask
+    ]
+    game_state['changes'].append(
+        (game_state['version'], [evidence['id'] for evidence in evidence_list], changed)
+    )
+
+def serialize_delta(game_state, since_version):
+    """
+    What changed since a version the client has seen, or None if that
+    version is unknown or too old for the change log
+    """
+    version = game_state['version']
+    changes = game_state['changes']
+    oldest = changes[0][0] - 1 if changes else version
+    if not oldest <= since_version <= version:
+        return None
+    
+    taken = []
+    changed = set()
+    for change_version, evidence_ids, variables in changes:
+        if change_version > since_version:
+            taken.extend(evidence_ids)
+            changed.update(variables)
+    
+    by_id = {action['id']: action for action in game_state['actions_taken'][-len(taken):]} if taken else {}
+    index = game_state['domain_index']
+    return {
+        'since_version': since_version,
+        'new_evidence': [by_id[evidence_id] for evidence_id in taken],
+        'removed_actions': taken,
+        'changed_domains': {
+            var: index.values_of(var, game_state['domain_masks'][var])
+            for var in index.variables if var in changed
+        },
+        'total_cost': game_state['total_cost'],
+        'possible_solutions': game_state['possible_solutions'],
+        'constraints_count': game_state['constraints_count']
+    }
+
+def state_payload(game_state, data):
+    """
+    Session part of an action response: a delta when the client sent the
+    since_version it last saw (unless it asks for full), else a snapshot
+    """
+    since_version = data.get('since_version')
+    if isinstance(since_version, int) and not data.get('full'):
+        delta = serialize_delta(game_state, since_version)
+        if delta is not None:
+            return {'version': game_state['version'], 'delta': delta}
+    
+    return {
+        'version': game_state['version'],
+        'game_state': serialize_game_state(game_state),
+        'available_actions': [
+            {
+                'id': action['id'],
+                'action': action['action'],
+                'cost': action['cost']
+            }
+            for action in game_state['available_actions']
+        ]
+    }
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def event_stream(events):
+    """Streaming response for a generator of server-sent events"""
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def session_locked(view):
+    """
+    Run a view holding the lock of the request's session, so concurrent
+    requests (possibly in other worker processes) can't interleave
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id')
+        if not isinstance(session_id, str):
+            return view(*args, **kwargs)
+        try:
+            with game_sessions.lock(session_id):
+                return view(*args, **kwargs)
+        except SessionConflict as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 409
+    return wrapper
+
 def apply_action(session_id, evidence_id):
     """Apply an action and return evidence"""
+    with game_sessions.lock(session_id):
+        return _apply_action(session_id, evidence_id)
+
+def _apply_action(session_id, evidence_id):
     game_state = get_game_state(session_id)
     if not game_state:
         return None
@@ -155,219 +269,137 @@ def apply_action(session_id, evidence_id):
     game_state['total_cost'] += evidence['cost']
     
     # Apply CSP constraints
+    before_masks = dict(game_state['domain_masks'])
     csp_result = apply_csp_constraints(game_state, evidence)
+    record_change(game_state, [evidence], before_masks)
+    
+    # Mutated in place: let a persistent store write it back
+    game_sessions.mark_dirty(session_id, game_state)
     
     return evidence, csp_result
 
-def apply_csp_constraints(game_state, evidence):
-    """Apply CSP constraints based on evidence"""
-    clue = evidence['clue'].lower()
-    action = evidence['action'].lower()
-    solution = game_state['solution']
-    
+def apply_actions(session_id, evidence_ids):
+    """
+    Apply an ordered list of actions with a single propagation pass
+    All or nothing: returns (evidence_list, csp_result), or (None, ids)
+    with the ids that can't be taken (unavailable or repeated)
+    """
+    with game_sessions.lock(session_id):
+        game_state = get_game_state(session_id)
+        if not game_state:
+            return None, []
+        
+        available = {action['id']: action for action in game_state['available_actions']}
+        invalid = [evidence_id for evidence_id in evidence_ids if evidence_id not in available]
+        if not invalid:
+            invalid = [evidence_id for evidence_id, n in Counter(evidence_ids).items() if n > 1]
+        if invalid:
+            return None, invalid
+        
+        evidence_list = [available[evidence_id] for evidence_id in evidence_ids]
+        taken = set(evidence_ids)
+        game_state['available_actions'] = [
+            a for a in game_state['available_actions']
+            if a['id'] not in taken
+        ]
+        game_state['actions_taken'].extend(evidence_list)
+        game_state['total_cost'] += sum(evidence['cost'] for evidence in evidence_list)
+        
+        before_masks = dict(game_state['domain_masks'])
+        csp_result = apply_csp_constraints(game_state, *evidence_list)
+        record_change(game_state, evidence_list, before_masks)
+        game_sessions.mark_dirty(session_id, game_state)
+        
+        return evidence_list, csp_result
+
+def apply_csp_constraints(game_state, *evidence_list):
+    """Apply CSP constraints based on evidence (one propagation for all of it)"""
     constraints = []
     steps = []
+    propagation = {}
     
-    # Parse clues and create constraints
-    if 'nervous' in clue or 'near the crime scene' in clue or 'missing' in clue:
-        # Positive indicator - likely the suspect
-        if 'butler' in action:
-            constraints.append(('suspect', 'Butler', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Strong evidence points to Butler as suspect",
-                'type': 'confirmation'
-            })
-        elif 'chef' in action:
-            constraints.append(('suspect', 'Chef', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Strong evidence points to Chef as suspect",
-                'type': 'confirmation'
-            })
-        elif 'gardener' in action:
-            constraints.append(('suspect', 'Gardener', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Strong evidence points to Gardener as suspect",
-                'type': 'confirmation'
-            })
-    
-    if 'alibi' in clue or 'kitchen all evening' in clue or 'working outside' in clue:
-        # Negative indicator - eliminates suspect
-        if 'butler' in action:
-            constraints.append(('suspect', 'Butler', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Butler eliminated as suspect due to alibi",
-                'type': 'elimination'
-            })
-        elif 'chef' in action:
-            constraints.append(('suspect', 'Chef', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Chef eliminated as suspect due to alibi",
-                'type': 'elimination'
-            })
-        elif 'gardener' in action:
-            constraints.append(('suspect', 'Gardener', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Gardener eliminated as suspect due to alibi",
-                'type': 'elimination'
-            })
-    
-    # Location constraints
-    if 'struggle' in clue or 'scattered' in clue or 'footprints' in clue:
-        if 'kitchen' in action:
-            constraints.append(('location', 'Kitchen', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Evidence confirms Kitchen as crime location",
-                'type': 'confirmation'
-            })
-        elif 'library' in action:
-            constraints.append(('location', 'Library', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Evidence confirms Library as crime location",
-                'type': 'confirmation'
-            })
-        elif 'garden' in action:
-            constraints.append(('location', 'Garden', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Evidence confirms Garden as crime location",
-                'type': 'confirmation'
-            })
-    
-    if 'undisturbed' in clue or 'pristine' in clue or 'no signs' in clue:
-        if 'kitchen' in action:
-            constraints.append(('location', 'Kitchen', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Kitchen eliminated as crime location",
-                'type': 'elimination'
-            })
-        elif 'library' in action:
-            constraints.append(('location', 'Library', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Library eliminated as crime location",
-                'type': 'elimination'
-            })
-        elif 'garden' in action:
-            constraints.append(('location', 'Garden', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Garden eliminated as crime location",
-                'type': 'elimination'
-            })
-    
-    # Weapon constraints
-    if 'blood' in clue or 'empty' in clue or 'recent use' in clue:
-        if 'knife' in action:
-            constraints.append(('weapon', 'Knife', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Evidence confirms Knife as murder weapon",
-                'type': 'confirmation'
-            })
-        elif 'poison' in action:
-            constraints.append(('weapon', 'Poison', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Evidence confirms Poison as murder weapon",
-                'type': 'confirmation'
-            })
-        elif 'rope' in action:
-            constraints.append(('weapon', 'Rope', 'confirm'))
-            steps.append({
-                'step': 'Confirmation',
-                'message': f"Evidence confirms Rope as murder weapon",
-                'type': 'confirmation'
-            })
-    
-    if 'clean' in clue or 'sealed and full' in clue or 'unused' in clue:
-        if 'knife' in action:
-            constraints.append(('weapon', 'Knife', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Knife eliminated as murder weapon",
-                'type': 'elimination'
-            })
-        elif 'poison' in action:
-            constraints.append(('weapon', 'Poison', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Poison eliminated as murder weapon",
-                'type': 'elimination'
-            })
-        elif 'rope' in action:
-            constraints.append(('weapon', 'Rope', 'eliminate'))
-            steps.append({
-                'step': 'Elimination',
-                'message': f"Rope eliminated as murder weapon",
-                'type': 'elimination'
-            })
+    # Evidence carries its constraint, resolved when the case was built
+    for evidence in evidence_list:
+        if evidence['constraint']:
+            constraints.append(evidence['constraint'])
+            steps.append(describe_constraint(evidence['constraint']))
     
     # Apply constraints using CSP solver
+    before_masks = dict(game_state['domain_masks'])
     if constraints:
-        game_state['constraints'].extend(constraints)
-        game_state['constraints_count'] = len(game_state['constraints'])
+        game_state['constraints_count'] += len(constraints)
         
-        # Update domains
-        for category, value, action_type in constraints:
-            if action_type == 'eliminate':
-                if value in game_state['current_domains'][category]:
-                    game_state['current_domains'][category].remove(value)
-            elif action_type == 'confirm':
-                if len(game_state['current_domains'][category]) > 1:
-                    game_state['current_domains'][category] = [value]
-        
-        # Use CSP solver for additional inference
-        solver = CSPSolver(
-            game_state['current_domains'],
-            game_state['constraints']
-        )
-        solver.solve()
+        # Propagate only the new constraints from the session's current fixpoint
+        solver = game_state['csp_solver']
+        solver.propagate(constraints, describe=False)
         additional_steps = solver.get_steps()
         steps.extend(additional_steps)
+        propagation = solver.get_stats()
         
-        # Update domains from solver
-        game_state['current_domains'] = solver.domains
-    
     # Calculate possible solutions
-    game_state['possible_solutions'] = (
-        len(game_state['current_domains']['suspect']) *
-        len(game_state['current_domains']['weapon']) *
-        len(game_state['current_domains']['location'])
-    )
+    hypotheses = game_state['hypotheses']
+    if hypotheses is not None:
+        # The new evidence as vectorized masks, plus whatever else this
+        # propagation narrowed; earlier evidence is already in the tensor
+        for constraint in constraints:
+            hypotheses.apply_constraint(*constraint)
+        hypotheses.apply_masks({
+            var: mask for var, mask in game_state['domain_masks'].items()
+            if mask != before_masks[var]
+        })
+        # Project back: joint constraints can rule out values the
+        # per-variable domains still hold
+        game_state['domain_masks'].update(hypotheses.project())
+        game_state['possible_solutions'] = hypotheses.count()
+    else:
+        game_state['possible_solutions'] = count_solutions(game_state['domain_masks'])
     
     return {
         'constraints_applied': len(constraints),
-        'steps': steps
+        'steps': steps,
+        'propagation': propagation
     }
 
 @game_bp.route('/start', methods=['POST'])
+@session_locked
 def start_game():
     """Start a new game"""
     try:
         data = request.json
         session_id = data.get('session_id', f"session-{random.randint(1000, 9999)}")
         
-        game_state = initialize_game(session_id)
+        # Optional generated case: {"suspects", "weapons", "locations", "evidence", "seed"}
+        case = None
+        seed = None
+        case_params = data.get('case')
+        if case_params:
+            seed = case_params.get('seed')
+            try:
+                case = generate_case(
+                    case_params.get('suspects', 3),
+                    case_params.get('weapons', 3),
+                    case_params.get('locations', 3),
+                    case_params.get('evidence'),
+                    seed
+                )
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+        
+        game_state = initialize_game(session_id, case, seed)
         
         return jsonify({
             'success': True,
             'session_id': session_id,
-            'game_state': {
-                'current_domains': game_state['current_domains'],
-                'total_cost': game_state['total_cost'],
-                'actions_taken': game_state['actions_taken'],
-                'possible_solutions': game_state['possible_solutions'],
-                'constraints_count': game_state['constraints_count']
+            'case': {
+                'name': game_state['case']['name'],
+                'domains': game_state['case']['domains'],
+                'total_solutions': game_state['case']['total_solutions']
             },
+            'version': game_state['version'],
+            'game_state': serialize_game_state(game_state),
             'available_actions': [
                 {
                     'id': action['id'],
@@ -384,6 +416,7 @@ def start_game():
         }), 500
 
 @game_bp.route('/action', methods=['POST'])
+@session_locked
 def take_action():
     """Take an investigation action"""
     try:
@@ -417,25 +450,78 @@ def take_action():
                 'cost': evidence['cost']
             },
             'csp_result': csp_result,
-            'game_state': {
-                'current_domains': game_state['current_domains'],
-                'total_cost': game_state['total_cost'],
-                'actions_taken': game_state['actions_taken'],
-                'possible_solutions': game_state['possible_solutions'],
-                'constraints_count': game_state['constraints_count']
-            },
-            'available_actions': [
+            **state_payload(game_state, data)
+        })
+    except Exception as e:
+        import traceback
+        print(f"Error in take_action: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+@game_bp.route('/actions', methods=['POST'])
+@session_locked
+def take_actions():
+    """Take several investigation actions, in order, in one request"""
+    try:
+        data = request.json
+        session_id = data.get('session_id')
+        evidence_ids = data.get('evidence_ids')
+        
+        if not session_id or not isinstance(evidence_ids, list) or not evidence_ids:
+            return jsonify({
+                'success': False,
+                'message': 'Missing session_id or evidence_ids'
+            }), 400
+        if not all(isinstance(evidence_id, int) for evidence_id in evidence_ids):
+            return jsonify({
+                'success': False,
+                'message': 'evidence_ids must be a list of integers'
+            }), 400
+        if len(evidence_ids) > MAX_EVIDENCE:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_EVIDENCE} actions per request'
+            }), 400
+        repeated = [evidence_id for evidence_id, n in Counter(evidence_ids).items() if n > 1]
+        if repeated:
+            return jsonify({
+                'success': False,
+                'message': 'evidence_ids must not repeat an action',
+                'invalid_ids': repeated
+            }), 400
+        
+        evidence_list, result = apply_actions(session_id, evidence_ids)
+        
+        if evidence_list is None:
+            return jsonify({
+                'success': False,
+                'message': 'Actions not found or session invalid',
+                'invalid_ids': result
+            }), 404
+        
+        game_state = get_game_state(session_id)
+        
+        return jsonify({
+            'success': True,
+            'steps': [
                 {
-                    'id': action['id'],
-                    'action': action['action'],
-                    'cost': action['cost']
+                    'id': evidence['id'],
+                    'action': evidence['action'],
+                    'clue': evidence['clue'],
+                    'cost': evidence['cost'],
+                    'constraint': describe_constraint(evidence['constraint']) if evidence['constraint'] else None
                 }
-                for action in game_state['available_actions']
-            ]
+                for evidence in evidence_list
+            ],
+            'csp_result': result,
+            **state_payload(game_state, data)
         })
     except Exception as e:
         import traceback
-        print(f"Error in take_action: {str(e)}")
+        print(f"Error in take_actions: {str(e)}")
         print(traceback.format_exc())
         return jsonify({
             'success': False,
@@ -443,6 +529,7 @@ def take_action():
         }), 500
 
 @game_bp.route('/accuse', methods=['POST'])
+@session_locked
 def make_accusation():
     """Make final accusation"""
     try:
@@ -481,4 +568,12 @@ def make_accusation():
         return jsonify({
             'success': False,
             'message': f'Error: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@game_bp.route('/session-stats', methods=['GET'])
+def session_stats():
+    """Size and eviction counters of every session store"""
+    return jsonify({
+        'success': True,
+        'stores': all_stats()
+    })
@@ -0,0 +1,73 @@
+"""
+Multi-process server without extra dependencies: a pre-forked pool of
+threaded Werkzeug servers accepting on one socket
+
+    python serve.py --workers 4 --port 5002
+
+Workers share sessions through SQLite (SESSION_DB) and lock each session
+across processes, so any worker can serve any request.
+"""
+import argparse
+import os
+import signal
+import socket
+
+
+def run_worker(sock, host, port):
+    """Serve requests on the inherited socket until killed"""
+    # Imported after the fork so each worker opens its own database connection
+    from werkzeug.serving import make_server
+    import wsgi
+
+    server = make_server(host, port, wsgi.app, threaded=True, fd=sock.fileno())
+    server.serve_forever()
+
+def spawn(sock, host, port):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            run_worker(sock, host, port)
+        finally:
+            os._exit(0)
+    return pid
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend with several worker processes")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    if not hasattr(os, 'fork'):
+        parser.error("multi-process serving needs os.fork (use a WSGI server with wsgi:app instead)")
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    workers = {spawn(sock, args.host, args.port) for _ in range(args.workers)}
+    print(f"🕵️ AI Detective backend: {args.workers} workers on http://{args.host}:{args.port}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Replace workers that die until asked to stop
+    while workers:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            workers.add(spawn(sock, args.host, args.port))
+
+if __name__ == '__main__':
+    main()
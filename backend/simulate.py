@@ -0,0 +1,188 @@
+"""
+Throughput harness: plays many complete games in-process with each planner
+and reports games/sec, per-step latency percentiles, average investigation
+cost and solve rate
+
+    python simulate.py                                  # every planner, standard case
+    python simulate.py --planner astar --games 2000 --workers 8
+    python simulate.py --suspects 6 --weapons 6 --locations 6 --evidence 40
+
+Games are sharded over a process pool; each worker drives sessions through
+initialize_game / apply_action exactly as the routes do. A step is one
+planner decision plus applying its evidence.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+PLANNERS = ('ai', 'ai-detective', 'astar')
+
+
+def play_ai(session_id, max_steps):
+    """routes/ai.py AIDetective (policy table, then A* lookahead)"""
+    from routes.ai import AIDetective, iter_auto_solve
+    ai_detective = AIDetective(session_id)
+    return iter_auto_solve(session_id, ai_detective, max_steps), ai_detective.get_solution
+
+def play_ai_detective(session_id, max_steps):
+    """routes/ai_detective.py AIDetective (information gain + CSP)"""
+    from routes.ai_detective import AIDetective, iter_auto_solve
+    from routes.game import get_game_state
+    game_state = get_game_state(session_id)
+    ai_detective = AIDetective(game_state, game_state['available_actions'], game_state['solution'])
+    return iter_auto_solve(session_id, ai_detective, max_steps), ai_detective.get_solution
+
+def play_astar(session_id, max_steps):
+    """AStarSearch.suggest_next_action on the live session"""
+    from algorithms.astar_search import AStarSearch
+    from algorithms.domains import is_solved
+    from routes.ai import SessionPlanningView
+    from routes.game import apply_action, get_game_state
+    game_state = get_game_state(session_id)
+
+    def steps():
+        for step in range(max_steps):
+            if is_solved(game_state['domain_masks']):
+                return
+            view = SessionPlanningView(game_state)
+            suggestion = AStarSearch(view, view).suggest_next_action()
+            if not suggestion:
+                return
+            if not apply_action(session_id, suggestion['recommended_action']['id']):
+                return
+            yield step
+
+    def solution():
+        masks = game_state['domain_masks']
+        if not is_solved(masks):
+            return None
+        index = game_state['domain_index']
+        return {var: index.first_value(var, mask) for var, mask in masks.items()}
+
+    return steps(), solution
+
+# Planner runners: (session_id, max_steps) -> (step iterator, solution getter)
+PLAY = {
+    'ai': play_ai,
+    'ai-detective': play_ai_detective,
+    'astar': play_astar,
+}
+
+
+def run_shard(planner, case_params, seeds, max_steps):
+    """
+    Play one game per seed in this process
+    Returns (games, seconds spent on them), one (steps, cost, solved,
+    step_latencies_ms) tuple per game; solved means the planner's answer is
+    the hidden solution
+    """
+    from models.case_generator import generate_case
+
+    case = generate_case(*case_params) if case_params else None
+    # Untimed game first: loads policy tables and warms the caches
+    play_game(planner, case, f"sim-{os.getpid()}-warmup", -1, max_steps)
+    started = time.perf_counter()
+    games = [
+        play_game(planner, case, f"sim-{os.getpid()}-{planner}-{seed}", seed, max_steps)
+        for seed in seeds
+    ]
+    return games, time.perf_counter() - started
+
+def play_game(planner, case, session_id, seed, max_steps):
+    """Play one game to the end, timing every step"""
+    from routes.game import game_sessions, initialize_game
+    game_state = initialize_game(session_id, case, seed)
+    steps, solution = PLAY[planner](session_id, max_steps)
+    latencies = []
+    started = time.perf_counter()
+    for _ in steps:
+        now = time.perf_counter()
+        latencies.append((now - started) * 1000)
+        started = now
+    solved = solution() == game_state['solution']
+    game_sessions.pop(session_id)
+    return len(latencies), game_state['total_cost'], solved, latencies
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def simulate(planner, games, workers, case_params=None, max_steps=50, seed=0):
+    """Play `games` games with one planner and summarize them"""
+    seeds = list(range(seed, seed + games))
+    shards = [seeds[i::workers] for i in range(workers) if seeds[i::workers]]
+
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        outcomes = list(pool.map(run_shard, [planner] * len(shards), [case_params] * len(shards),
+                                 shards, [max_steps] * len(shards)))
+    results = [game for games, _ in outcomes for game in games]
+    # Shards run side by side: the slowest one bounds the throughput
+    # (process start-up and warmup games are not counted)
+    elapsed = max(seconds for _, seconds in outcomes)
+
+    latencies = sorted(latency for game in results for latency in game[3])
+    return {
+        'planner': planner,
+        'games': len(results),
+        'workers': len(shards),
+        'elapsed_seconds': round(elapsed, 3),
+        'games_per_second': round(len(results) / elapsed, 1),
+        'steps': len(latencies),
+        'step_latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            **{f'p{p}': round(percentile(latencies, p), 3) for p in (50, 90, 99)},
+            'max': round(latencies[-1], 3) if latencies else 0.0
+        },
+        'average_cost': round(sum(game[1] for game in results) / len(results), 2),
+        'average_steps': round(len(latencies) / len(results), 2),
+        'solve_rate': round(sum(game[2] for game in results) / len(results), 4)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many games in-process and measure throughput")
+    parser.add_argument('--planner', choices=PLANNERS + ('all',), default='all')
+    parser.add_argument('--games', type=int, default=200, help="games per planner")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--max-steps', type=int, default=50, help="give up on a game after this many steps")
+    parser.add_argument('--seed', type=int, default=0, help="first game seed (game i uses seed + i)")
+    parser.add_argument('--suspects', type=int, help="generated case size (default: standard case)")
+    parser.add_argument('--weapons', type=int, default=3)
+    parser.add_argument('--locations', type=int, default=3)
+    parser.add_argument('--evidence', type=int, help="evidence items in the generated case")
+    parser.add_argument('--case-seed', type=int, default=0, help="seed of the generated case")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+    if args.games < 1 or args.workers < 1:
+        parser.error("--games and --workers must be positive")
+
+    case_params = None
+    if args.suspects is not None:
+        case_params = (args.suspects, args.weapons, args.locations, args.evidence, args.case_seed)
+
+    planners = PLANNERS if args.planner == 'all' else (args.planner,)
+    reports = [
+        simulate(planner, args.games, args.workers, case_params, args.max_steps, args.seed)
+        for planner in planners
+    ]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+
+    print(f"{'planner':14} {'games/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'avg cost':>9} {'steps':>6} {'solved':>7}")
+    for report in reports:
+        latency = report['step_latency_ms']
+        print(f"{report['planner']:14} {report['games_per_second']:>9} {latency['p50']:>8} "
+              f"{latency['p90']:>8} {latency['p99']:>8} {report['average_cost']:>9} "
+              f"{report['average_steps']:>6} {report['solve_rate']:>7.1%}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
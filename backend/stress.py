@@ -0,0 +1,155 @@
+"""
+Concurrency stress test: many threads hammer one game session with
+actions, AI moves and suggestions, then the session's invariants are
+checked (every evidence applied at most once, costs add up, domains
+match the clues)
+
+    python stress.py                       # in-process, threaded
+    python stress.py --url http://localhost:5002 --threads 64
+
+Exits with status 1 if any invariant is violated.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+class LocalClient:
+    """Calls the app in-process through Flask's test client"""
+    def __init__(self):
+        from app import app
+        self.app = app
+
+    def post(self, path, body):
+        response = self.app.test_client().post(path, json=body)
+        return response.status_code, response.get_json()
+
+
+class HttpClient:
+    """Calls a running server"""
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def post(self, path, body):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(body).encode(),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+
+def hammer(client, session_id, evidence_ids, requests, seed, results):
+    """One thread: a random mix of requests on the shared session"""
+    rng = random.Random(seed)
+    for _ in range(requests):
+        roll = rng.random()
+        if roll < 0.6:
+            path, body = '/api/game/action', {'session_id': session_id, 'evidence_id': rng.choice(evidence_ids)}
+        elif roll < 0.8:
+            path, body = '/api/ai/make-move', {'session_id': session_id}
+        else:
+            path, body = '/api/ai/suggest', {'session_id': session_id}
+        status, _ = client.post(path, body)
+        results[(path, status)] += 1
+
+def check_session(game_state, costs):
+    """Invariants of a session after the run; returns a list of violations"""
+    errors = []
+    taken = [action['id'] for action in game_state['actions_taken']]
+    available = [action['id'] for action in game_state['available_actions']]
+    duplicates = [evidence_id for evidence_id, n in Counter(taken).items() if n > 1]
+    if duplicates:
+        errors.append(f"evidence applied more than once: {duplicates}")
+    if set(taken) & set(available):
+        errors.append("evidence both taken and still available")
+    if sorted(taken + available) != sorted(costs):
+        errors.append("evidence lost or duplicated between taken and available")
+    expected_cost = sum(costs[evidence_id] for evidence_id in taken)
+    if game_state['total_cost'] != expected_cost:
+        errors.append(f"total cost {game_state['total_cost']} != {expected_cost} (lost update)")
+
+    # Replaying the taken evidence must give the same domains
+    index = game_state['domain_index']
+    masks = index.full()
+    for action in game_state['actions_taken']:
+        if action['constraint']:
+            variable, value, action_type = action['constraint']
+            bit = index.bit(variable, value)
+            if action_type == 'eliminate':
+                masks[variable] &= ~bit
+            elif masks[variable] & (masks[variable] - 1):
+                masks[variable] &= bit
+    if masks != dict(game_state['domain_masks']):
+        errors.append("domains don't match the clues of the taken evidence")
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer one session from many threads")
+    parser.add_argument('--url', help="running server (default: in-process app)")
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50, help="requests per thread")
+    parser.add_argument('--rounds', type=int, default=5, help="fresh sessions to hammer")
+    parser.add_argument('--evidence', type=int, default=60, help="evidence items in the generated case")
+    args = parser.parse_args()
+
+    client = HttpClient(args.url) if args.url else LocalClient()
+    failures = 0
+    started = time.perf_counter()
+    total = Counter()
+
+    for round_number in range(args.rounds):
+        session_id = f"stress-{random.randrange(10 ** 9)}"
+        status, body = client.post('/api/game/start', {
+            'session_id': session_id,
+            'case': {'suspects': 6, 'weapons': 6, 'locations': 6, 'evidence': args.evidence, 'seed': round_number}
+        })
+        if status != 200:
+            print(f"Could not start a game: {body}")
+            return 1
+        costs = {action['id']: action['cost'] for action in body['available_actions']}
+
+        results = Counter()
+        threads = [
+            threading.Thread(target=hammer, args=(client, session_id, list(costs), args.requests, i, results))
+            for i in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total.update(results)
+
+        # Check the final state (in-process only: the server keeps it private)
+        if args.url:
+            status, body = client.post('/api/game/action', {'session_id': session_id, 'evidence_id': -1})
+            errors = [] if status == 404 else [f"unexpected status {status}"]
+        else:
+            from routes.game import get_game_state
+            errors = check_session(get_game_state(session_id), costs)
+        errors += [f"{count} x HTTP {status} on {path}" for (path, status), count in results.items() if status >= 500]
+
+        failures += bool(errors)
+        print(f"Round {round_number + 1}: {sum(results.values())} requests, "
+              f"{'OK' if not errors else 'FAILED'}")
+        for error in errors:
+            print(f"  - {error}")
+
+    elapsed = time.perf_counter() - started
+    print(f"{sum(total.values())} requests in {elapsed:.2f}s ({sum(total.values()) / elapsed:.0f} req/s)")
+    for (path, status), count in sorted(total.items()):
+        print(f"  {path:20} {status}: {count}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
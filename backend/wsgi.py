@@ -0,0 +1,15 @@
+"""
+WSGI entry point for multi-worker servers, e.g.
+
+    gunicorn -w 4 --threads 8 -b 0.0.0.0:5002 wsgi:app
+
+Workers share sessions through SQLite (SESSION_DB) and lock each session
+across processes. Don't preload the app: every worker must open its own
+database connection after the fork.
+"""
+import os
+
+os.environ.setdefault('SESSION_BACKEND', 'sqlite')
+os.environ.setdefault('SESSION_SHARED', '1')
+
+from app import app  # noqa: E402
@@ -1,11 +1,11 @@
 const API_URL = "http://localhost:5002/api";
 
 export const gameService = {
-  startGame: async (sessionId) => {
+  startGame: async (sessionId, caseParams) => {
     const response = await fetch(`${API_URL}/game/start`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ session_id: sessionId }),
+      body: JSON.stringify({ session_id: sessionId, case: caseParams }),
     });
     return response.json();
   },
@@ -19,6 +19,15 @@ export const gameService = {
     return response.json();
   },
 
+  takeActions: async (sessionId, evidenceIds) => {
+    const response = await fetch(`${API_URL}/game/actions`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ session_id: sessionId, evidence_ids: evidenceIds }),
+    });
+    return response.json();
+  },
+
   makeAccusation: async (sessionId, guess) => {
     const response = await fetch(`${API_URL}/game/accuse`, {
       method: "POST",
@@ -48,6 +57,29 @@ export const aiService = {
     return response.json();
   },
 
+  // Streams auto-solve steps as they are computed; returns the EventSource.
+  // onError gets the server's error payload (or a generic one if the
+  // connection dropped); without it the error is passed to onDone.
+  autoSolveStream: (sessionId, onStep, onDone, onError = onDone) => {
+    const source = new EventSource(
+      `${API_URL}/ai/auto-solve/stream?session_id=${encodeURIComponent(sessionId)}`
+    );
+    source.addEventListener("step", (event) => onStep(JSON.parse(event.data)));
+    source.addEventListener("done", (event) => {
+      source.close();
+      onDone(JSON.parse(event.data));
+    });
+    source.addEventListener("error", (event) => {
+      source.close();
+      onError(
+        event.data
+          ? JSON.parse(event.data)
+          : { success: false, message: "Connection to the server was lost" }
+      );
+    });
+    return source;
+  },
+
   getSuggestion: async (sessionId) => {
     const response = await fetch(`${API_URL}/ai/suggest`, {
       method: "POST",